@@ -2,18 +2,75 @@
 Library for easily creating anisotropic cellular automata
 """
 
-from dataclasses import dataclass
-from typing import Literal
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from operator import mul
+from typing import Callable, Iterator, Literal
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only needed for the numpy backend
+    np = None
 
 # ------------------ VARIABLES ------------------
 
-__ALL__ = ["cell_state_register", "cell_state_add_new_rule", "cell_pattern_create", "grid_step"]
+__ALL__ = [
+    "cell_state_register", "cell_state_add_new_rule", "cell_state_id", "cell_pattern_create", "cell_pattern_compile",
+    "grid_step", "grid_step_int", "grid_encode", "grid_decode", "grid_step_numpy", "grid_run", "grid_iter", "grid_step_threaded",
+    "grid_find_cycle", "grid_cycle_at", "grid_step_delta", "apply_delta",
+    "grid_step_jit", "ensemble_step",
+    "halo_grid_encode", "halo_grid_decode", "halo_grid_step",
+    "grid_step_table", "transition_table_stats", "grid_step_tree", "decision_tree_stats", "decision_tree_print",
+    "grid_step_bitset",
+    "active_grid_create", "active_grid_step", "grid_zobrist_hash", "quiescent_states",
+    "bitboard_encode", "bitboard_decode", "bitboard_step",
+    "hashlife_create", "hashlife_advance", "hashlife_to_grid",
+    "sparse_grid_create", "sparse_grid_from_grid", "sparse_grid_to_grid", "sparse_grid_step",
+    "chunk_world_create", "chunk_world_from_grid", "chunk_world_to_grid", "chunk_world_step",
+    "parallel_grid_create", "parallel_grid_step", "parallel_grid_to_grid", "parallel_grid_close",
+]
 
 CELL_STATE_REGISTRY = {}
 
 BORDER_VALUE = "border"
 EMPTY_VALUE = "empty"
+WILDCARD_VALUE = "*"
 NEIGHBORHOODS = {}
+NEIGHBORHOOD_OFFSETS = {}  # (dy, dx) array offsets in the same order as NEIGHBORHOODS tuples
+
+# What a neighbor past the edge of the grid is, reflect mirrors the grid so the edge cell is its own neighbor
+BOUNDARY_MODES = ("border", "wrap", "reflect")
+
+# State table (border is interned first so it always has id 0)
+BORDER_ID = 0
+WILDCARD_ID = -1
+STATE_NAMES = [BORDER_VALUE]
+STATE_IDS = {BORDER_VALUE: BORDER_ID}
+
+# Compiled forms of the registry, cleared whenever the registry changes
+_COMPILED_CACHE = {}
+
+# Thread pools of grid_step_threaded by thread count, kept so threads are not started every step
+_THREAD_POOLS = {}
+
+# Kernel of grid_step_jit, None without numba, numba is only imported on the first call since that alone takes longer
+# than importing calib
+_JIT = {}
+
+# Default number of quadtree nodes a hashlife cache holds before it is garbage collected
+HASHLIFE_MAX_NODES = 1 << 20
+
+# Default width and height of the tiles of a chunk world
+CHUNK_SIZE = 64
+
+# Largest transition table (in entries) built per state before falling back to pattern scanning
+TRANSITION_TABLE_MAX_SIZE = 1 << 20
 
 # ------------------ DEFINITIONS ------------------
 
@@ -27,16 +84,136 @@ class Cell:
     name: str
     rules: list
     data: dict
+    neighborhood_types: list = field(default_factory=list)  # distinct types used by rules, in rule order
+
+@dataclass
+class TransitionTable:
+    neighborhood_type: str
+    weights: tuple  # multiplied with the neighborhood tuple and summed to get the table index
+    table: list
+    build_time: float
+
+@dataclass
+class HaloGrid:
+    cells: list[int]  # row major, surrounded by a ring of radius BORDER_ID cells
+    width: int
+    height: int
+    radius: int
+    ring: str = "border"  # boundary mode the ring was last filled for
+
+    @property
+    def stride(self) -> int:
+        return self.width + 2 * self.radius
+
+@dataclass
+class GridDelta:
+    xs: array  # parallel arrays with one entry per changed cell
+    ys: array
+    old_ids: array
+    new_ids: array
+
+@dataclass
+class GridCycle:
+    start: int  # first generation that repeats, the fixed point when period is 1
+    period: int
+    frames: list  # generations start to start + period - 1
+    grid: list[list]  # generation 0, for generations before the cycle starts
+    boundary: str
+
+@dataclass
+class ActiveGrid:
+    grid: list[list[int]]
+    active: set | None  # (x, y) cells to evaluate next step, None means every cell
+    active_ratio: float = 1.0  # fraction of cells evaluated by the step that produced this grid
+    matchers: list | None = None  # compiled matchers the active set was derived with
+    hash: int = 0  # zobrist hash of grid, updated only for the cells that changed
+
+@dataclass
+class BitBoard:
+    rows: list[int]  # bit x of a row is set when the cell is in the second (on) state
+    width: int
+    states: tuple  # (off state name, on state name)
+
+@dataclass
+class SparseGrid:
+    cells: dict  # (x, y) -> state name, cells not in it are EMPTY_VALUE
+    width: int
+    height: int
+
+@dataclass
+class ChunkWorld:
+    chunks: dict  # (cx, cy) -> chunk_size x chunk_size list of state names, missing chunks are empty
+    awake: set  # chunks to evaluate next step, the rest sleep
+    chunk_size: int
+
+@dataclass
+class ParallelGrid:
+    width: int
+    height: int
+    blocks: list  # two shared memory blocks of int32 cells, stepping reads one and writes the other
+    pool: object
+    bands: list  # (y0, y1) row ranges stepped by the pool workers
+    front: int = 0  # index of the block holding the current generation
+
+@dataclass(eq=False, slots=True)
+class QuadNode:
+    level: int  # covers a 2^level x 2^level square, level 1 children are state ids
+    nw: object
+    ne: object
+    sw: object
+    se: object
+    results: dict  # j -> center QuadNode advanced 2^j generations
+
+@dataclass
+class HashLifeCache:
+    nodes: dict  # (nw, ne, sw, se) -> canonical QuadNode
+    border_nodes: list  # uniform border node per level, level 0 is BORDER_ID
+    max_nodes: int
+    matchers: list | None = None  # compiled matchers the memoized results were calculated with
+
+@dataclass
+class HashLifeWorld:
+    root: QuadNode  # the grid sits at the top left corner, everything else is border
+    width: int
+    height: int
+    generation: int
+    cache: HashLifeCache
+
+@dataclass(eq=False)
+class DecisionNode:
+    dy: int
+    dx: int
+    branches: dict  # neighbor state id -> DecisionNode or resulting state id
+    default: object  # taken when the neighbor matches none of the branches
 
 # ------------------ CELL STATE FUNCTIONS ------------------
 
 def cell_state_register(name: str, **kwargs) -> None:
     CELL_STATE_REGISTRY[name] = Cell(name, [], kwargs)
 
+    # Ids are never reused, re-registering a state keeps its id
+    if name not in STATE_IDS:
+        STATE_IDS[name] = len(STATE_NAMES)
+        STATE_NAMES.append(name)
+
+    _COMPILED_CACHE.clear()
+
 
 def cell_state_add_new_rule(matching_pattern: Pattern, resulting_new_state: str) -> None:
     name = matching_pattern.pattern[0]
-    CELL_STATE_REGISTRY[name].rules.append((matching_pattern, resulting_new_state))
+    cell = CELL_STATE_REGISTRY[name]
+    cell.rules.append((matching_pattern, resulting_new_state))
+
+    if matching_pattern.neighborhood_type not in cell.neighborhood_types:
+        cell.neighborhood_types.append(matching_pattern.neighborhood_type)
+
+    _COMPILED_CACHE.clear()
+
+
+def cell_state_id(name: str) -> int:
+    if name not in STATE_IDS:
+        raise ValueError(f"Unregistered cell state '{name}'")
+    return STATE_IDS[name]
 
 
 def _cell_pattern_match(pattern: Pattern, neighborhood: list) -> bool:
@@ -57,259 +234,3350 @@ def _cell_pattern_match(pattern: Pattern, neighborhood: list) -> bool:
 
     return True
 
-# ------------------ GRID FUNCTIONS ------------------
 
-def grid_step(grid: list[list]) -> list[list]:
+def cell_pattern_compile(pattern: Pattern) -> tuple:
+    return tuple(WILDCARD_ID if value == WILDCARD_VALUE else cell_state_id(value) for value in pattern.pattern)
 
-    NEIGHBORHOOD_TYPE_COUNT = len(NEIGHBORHOODS.keys())
 
-    # Create new grid
-    new_grid = [[EMPTY_VALUE for _ in range(len(grid[0]))] for _ in range(len(grid))]
+def _rules_compile() -> list:
 
-    # Iterate over grid
-    for y, row in enumerate(grid):
-        for x, cell_state_name in enumerate(row):
-            for pattern, cell_new_state_name in CELL_STATE_REGISTRY[cell_state_name].rules:
+    # Indexed by state id, each entry is a list of (neighborhood_type, id_pattern, new_state_id)
+    compiled = _COMPILED_CACHE.get("rules")
 
-                neighborhood_type = pattern.neighborhood_type
-                neighborhood = NEIGHBORHOODS[neighborhood_type](grid, x, y)
-                # for cells with bunch of rules neighbor gets calculated multiple times
-                # simple cache could be implemented to avoid this
+    if compiled is None:
+        # Rules testing a state that was never registered can not match, so they are dropped
+        compiled = [[] for _ in STATE_NAMES]
+        for name, cell in CELL_STATE_REGISTRY.items():
+            compiled[STATE_IDS[name]] = [
+                (pattern.neighborhood_type, cell_pattern_compile(pattern), cell_state_id(new_state_name))
+                for pattern, new_state_name in cell.rules
+                if all(value == WILDCARD_VALUE or value in STATE_IDS for value in pattern.pattern)
+            ]
+        _COMPILED_CACHE["rules"] = compiled
 
-                if _cell_pattern_match(pattern, neighborhood):
-                    new_grid[y][x] = cell_new_state_name
-                    break
-            else:
-                new_grid[y][x] = cell_state_name
+    return compiled
 
-    return new_grid
+# ------------------ MATCHER FUNCTIONS ------------------
 
-# ------------------ UTILS ------------------
+def _cell_matcher_source(state_value, neighborhood_types: list, rules: list, wildcard, flat_offsets=None) -> str:
 
-def cell_pattern_create(rule_parts: dict, neighborhood_type: Literal["moore", "von_neumann"]) -> Pattern:
+    # rules is a list of (neighborhood_type, values, new_value), only concrete neighbor positions get tested
+    # With flat_offsets (neighborhood type -> flat index offsets) the matcher reads a halo padded flat grid at index i
+    lines = ["def matcher(grid, x, y):" if flat_offsets is None else "def matcher(grid, i):"]
+    extracted = set()
 
-    empty_pattern = []
-    positions = []
+    for neighborhood_type, values, new_value in rules:
+        index = neighborhood_types.index(neighborhood_type)
 
-    if (0, 0) not in rule_parts.keys():
-        raise ValueError("Rule must contain (0, 0) offset (self)")
+        if flat_offsets is not None:
+            conditions = [
+                f"grid[i {'-' if offset < 0 else '+'} {abs(offset)}] == {value!r}"
+                for offset, value in zip(flat_offsets[neighborhood_type][1:], values[1:])
+                if value != wildcard
+            ]
 
-    # Get position (list containting index information of offsets and length of pattern)
-    match(neighborhood_type):
-        case "moore":
-            positions = [(0, 0), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
-        case "von_neumann":
-            positions = [(0, 0), (0, 1), (1, 0), (0, -1), (-1, 0)]
-        case _:
-            raise ValueError("Invalid neighborhood type")
+        else:
+            # Neighborhoods are extracted right before the first rule that needs them
+            if index not in extracted:
+                extracted.add(index)
+                lines.append(f"    n{index} = neighborhood_{index}(grid, x, y, border)")
 
-    # Create new empty pattern
-    new_pattern = ["*" for _ in positions]
+            conditions = [f"n{index}[{i}] == {value!r}" for i, value in enumerate(values) if i > 0 and value != wildcard]
 
-    for offset, state_id in rule_parts.items():
-        if offset in positions:
-            index = positions.index(offset)
-            new_pattern[index] = state_id
+        if not conditions:  # always matches, following rules are unreachable
+            lines.append(f"    return {new_value!r}")
+            break
 
-    return Pattern(new_pattern, neighborhood_type)
+        lines.append(f"    if {' and '.join(conditions)}:")
+        lines.append(f"        return {new_value!r}")
+    else:
+        lines.append(f"    return {state_value!r}")
 
+    return "\n".join(lines) + "\n"
 
-def print_grid(grid):
-    for row in grid:
-        print(row)
 
-# ------------------ NEIGHBORHOOD FUNCTIONS ------------------
+def _cell_matcher_build(
+    state_value, neighborhood_types: list, rules: list, wildcard, border, neighborhoods=NEIGHBORHOODS, flat_offsets=None
+):
 
-def _get_moore_neighborhood(arr, x, y):
-    return (
-        arr[y][x],
-        arr[y - 1][x] if y > 0 else BORDER_VALUE,
-        arr[y - 1][x + 1] if y > 0 and x < len(arr[y]) - 1 else BORDER_VALUE,
-        arr[y][x + 1] if x < len(arr[y]) - 1 else BORDER_VALUE,
-        arr[y + 1][x + 1] if y < len(arr) - 1 and x < len(arr[y]) - 1 else BORDER_VALUE,
-        arr[y + 1][x] if y < len(arr) - 1 else BORDER_VALUE,
-        arr[y + 1][x - 1] if y < len(arr) - 1 and x > 0 else BORDER_VALUE,
-        arr[y][x - 1] if x > 0 else BORDER_VALUE,
-        arr[y - 1][x - 1] if y > 0 and x > 0 else BORDER_VALUE
-    )
-NEIGHBORHOODS["moore"] = _get_moore_neighborhood
+    source = _cell_matcher_source(state_value, neighborhood_types, rules, wildcard, flat_offsets)
 
-def _get_von_neuman_neighborhood(arr, x, y):
-    return (
-        arr[y][x],
-        arr[y - 1][x] if y > 0 else BORDER_VALUE,
-        arr[y][x + 1] if x < len(arr[y]) - 1 else BORDER_VALUE,
-        arr[y + 1][x] if y < len(arr) - 1 else BORDER_VALUE,
-        arr[y][x - 1] if x > 0 else BORDER_VALUE,
-    )
-NEIGHBORHOODS["von_neumann"] = _get_von_neuman_neighborhood
+    namespace = {"border": border}
+    for index, neighborhood_type in enumerate(neighborhood_types):
+        namespace[f"neighborhood_{index}"] = neighborhoods[neighborhood_type]
 
-# ------------------ TESTS ------------------
+    exec(compile(source, f"<calib matcher {state_value!r}>", "exec"), namespace)
 
-def _test_neighborhood_functions():
+    matcher = namespace["matcher"]
+    matcher.source = source
+    return matcher
 
-    TEST_RESULT_MOORE = ("5", "2", "3", "6", "9", "8", "7", "4", "1")
-    TEST_RESULT_VON_NEUMANN = ("5", "2", "6", "8", "4")
 
-    # Sample grid
-    grid = [
-        ["1", "2", "3"],
-        ["4", "5", "6"],
-        ["7", "8", "9"]
-    ]
+def _cell_matchers_compile(key: str = "matchers", neighborhoods: dict = NEIGHBORHOODS) -> dict:
 
-    # Test coordinates
-    x, y = 1, 1
+    # Keyed by state name, None for states without rules
+    matchers = _COMPILED_CACHE.get(key)
 
-    print("Grid:")
-    print_grid(grid)
+    if matchers is None:
+        matchers = {}
+        for name, cell in CELL_STATE_REGISTRY.items():
+            rules = [(pattern.neighborhood_type, pattern.pattern, new_state_name) for pattern, new_state_name in cell.rules]
+            matchers[name] = _cell_matcher_build(
+                name, cell.neighborhood_types, rules, WILDCARD_VALUE, BORDER_VALUE, neighborhoods
+            ) if rules else None
+        _COMPILED_CACHE[key] = matchers
 
-    print("Coordinates:", x, y)
+    return matchers
 
-    res = []
-    for _t, func in NEIGHBORHOODS.items():
-        neighborhood = func(grid, x, y)
-        print(f"{_t.capitalize()} Result:", neighborhood)
-        res.append(neighborhood)
 
-    assert res[0] == TEST_RESULT_MOORE, f"Moore neighborhood function failed with {res[0]}. Expected: {TEST_RESULT_MOORE}" # noqa
-    assert res[1] == TEST_RESULT_VON_NEUMANN, f"Von Neumann neighborhood function failed with {res[1]}. Expected: {TEST_RESULT_VON_NEUMANN}" # noqa
+def _cell_matchers_compile_int() -> list:
 
+    # Indexed by state id, None for states without rules
+    matchers = _COMPILED_CACHE.get("matchers_int")
 
-def _test_cell_pattern_create():
+    if matchers is None:
+        matchers = [None for _ in STATE_NAMES]
+        for state_id, rules in enumerate(_rules_compile()):
+            if rules:
+                neighborhood_types = CELL_STATE_REGISTRY[STATE_NAMES[state_id]].neighborhood_types
+                matchers[state_id] = _cell_matcher_build(state_id, neighborhood_types, rules, WILDCARD_ID, BORDER_ID)
+        _COMPILED_CACHE["matchers_int"] = matchers
 
-    TEST_PATTERN = Pattern(["self", "1", "2", "3", "4", "5", "6", "7", "8"], "moore")
+    return matchers
 
-    # Sample rule
-    rule = {
-        (0, 0): "self",
-        (0, 1): "1",
-        (1, 1): "2",
-        (1, 0): "3",
-        (1, -1): "4",
-        (0, -1): "5",
-        (-1, -1): "6",
-        (-1, 0): "7",
-        (-1, 1): "8",
+
+def _cell_matchers_compile_flat(stride: int) -> list:
+
+    # Like _cell_matchers_compile_int but for halo padded flat grids with rows stride cells apart
+    key = ("matchers_flat", stride)
+    matchers = _COMPILED_CACHE.get(key)
+
+    if matchers is None:
+        flat_offsets = {
+            neighborhood_type: tuple(dy * stride + dx for dy, dx in offsets)
+            for neighborhood_type, offsets in NEIGHBORHOOD_OFFSETS.items()
+        }
+        matchers = [None for _ in STATE_NAMES]
+        for state_id, rules in enumerate(_rules_compile()):
+            if rules:
+                neighborhood_types = CELL_STATE_REGISTRY[STATE_NAMES[state_id]].neighborhood_types
+                matchers[state_id] = _cell_matcher_build(
+                    state_id, neighborhood_types, rules, WILDCARD_ID, BORDER_ID, flat_offsets=flat_offsets
+                )
+        _COMPILED_CACHE[key] = matchers
+
+    return matchers
+
+# ------------------ QUIESCENCE FUNCTIONS ------------------
+
+def _quiescent_states_find(rules_by_state: dict, wildcard, border) -> tuple:
+
+    # Inert states have no rules, uniform states can not change when every neighbor is the same state or border
+    inert_states = {state for state, rules in rules_by_state.items() if not rules}
+    uniform_states = {
+        state
+        for state, rules in rules_by_state.items()
+        if all(
+            new_state == state or any(value not in (wildcard, state, border) for value in values[1:])
+            for _, values, new_state in rules
+        )
     }
 
-    # Sample neighborhood type
-    neighborhood_type = "moore"
+    return uniform_states, inert_states
 
-    pattern = cell_pattern_create(rule, neighborhood_type)
 
-    assert pattern == TEST_PATTERN, f"Pattern creation util failed with {pattern}. Expected: {TEST_PATTERN}"
+def _quiescent_compile() -> tuple:
 
-    print("Pattern:", pattern)
+    quiescent = _COMPILED_CACHE.get("quiescent")
 
+    if quiescent is None:
+        rules_by_state = {
+            name: [(pattern.neighborhood_type, pattern.pattern, new_state_name) for pattern, new_state_name in cell.rules]
+            for name, cell in CELL_STATE_REGISTRY.items()
+        }
+        quiescent = _COMPILED_CACHE["quiescent"] = _quiescent_states_find(rules_by_state, WILDCARD_VALUE, BORDER_VALUE)
 
-def _test_cell_state_and_pattern_matching_functions():
+    return quiescent
 
-    # Create cell states
-    cell_state_register("empty", color=(0, 0, 0))
-    cell_state_register("sand", color=(255, 255, 0))
 
-    assert CELL_STATE_REGISTRY["sand"] == Cell("sand", [], {"color": (255, 255, 0)})
+def _quiescent_compile_int() -> tuple:
 
-    # Add rule (for converting sand with empty below it to empty since sand falls)
-    pattern = cell_pattern_create(
-        rule_parts={
-            (0, 00): "sand",  # self (sand)
-            (0, -1): "empty",  # bottom (empty)
-        },
-        neighborhood_type="moore"
-    )
+    quiescent = _COMPILED_CACHE.get("quiescent_int")
 
-    cell_state_add_new_rule(pattern, "empty")
+    if quiescent is None:
+        rules_by_state = dict(enumerate(_rules_compile()))
+        quiescent = _COMPILED_CACHE["quiescent_int"] = _quiescent_states_find(rules_by_state, WILDCARD_ID, BORDER_ID)
 
-    # Add rule (for converting empty with sand above it to sand since sand falls)
-    pattern = cell_pattern_create(
-        rule_parts={
-            (0, 0): "empty",  # self (empty)
-            (0, 1): "sand",  # top (sand)
-        },
-        neighborhood_type="moore"
-    )
+    return quiescent
 
-    cell_state_add_new_rule(pattern, "sand")
 
-    print("Cell State Registry:", CELL_STATE_REGISTRY)
+def _quiet_rows_quiescent(quiescent: tuple) -> tuple:
 
-    example_grid = [
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "sand", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-    ]
+    # Uniform rows are only compared with the rows directly above and below them, which is not enough
+    # for neighborhoods reaching further or of unknown shape. Inert states never change either way
+    uniform_states, inert_states = quiescent
 
-    print("Example Grid:")
-    print_grid(example_grid)
+    if _unmapped_neighborhood_type() is not None or _neighborhood_radius() > 1:
+        return (), inert_states
 
-    # Check if pattern matches at (1, 2)
-    print("\nChecking if pattern matches at (1, 2)")
-    neighborhood = NEIGHBORHOODS["moore"](example_grid, 1, 2)
-    print("Neighborhood:", neighborhood)
-    assert _cell_pattern_match(pattern, neighborhood), f"Pattern matching failed with {neighborhood}. Expected: {pattern}" # noqa
-    print("Success!")
+    return uniform_states, inert_states
 
-    # Check if pattern does not match at (0, 0)
-    print("\nChecking if pattern does not match at (0, 0)")
-    neighborhood = neighborhood = NEIGHBORHOODS["moore"](example_grid, 0, 0)
-    print("Neighborhood:", neighborhood)
-    assert not _cell_pattern_match(pattern, neighborhood), f"Pattern matching failed with {neighborhood}. Expected: {pattern}" # noqa
-    print("Success!")
 
-def _test_grid_step():
-    example_grid = [
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "sand", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-    ]
+def _grid_quiet_rows(grid: list[list], quiescent: tuple, wrap: bool = False) -> list[bool]:
 
-    TEST_STEP_1_GRID = [
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "sand", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-    ]
+    # Rows that can be copied without evaluating any cell, rows outside the grid count as border
+    # (or as the same row when reflected) unless the grid wraps around
+    uniform_states, inert_states = _quiet_rows_quiescent(quiescent)
+    row_states = [row[0] if row and row.count(row[0]) == len(row) else None for row in grid]
+    last = len(grid) - 1
 
-    TEST_STEP_2_AND_3_GRID = [
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "empty", "empty", "empty"],
-        ["empty", "sand", "empty", "empty"],
+    return [
+        state in inert_states or (
+            state in uniform_states
+            and (y == 0 and not wrap or row_states[y - 1] == state)
+            and (y == last and not wrap or row_states[(y + 1) % len(row_states)] == state)
+        )
+        for y, state in enumerate(row_states)
     ]
 
-    TEST_GRIDS = [TEST_STEP_1_GRID, TEST_STEP_2_AND_3_GRID, TEST_STEP_2_AND_3_GRID]
 
-    print("Testing grid step watch if the sand falls")
+def quiescent_states() -> dict:
 
-    print("Example Grid:")
-    print_grid(example_grid)
+    uniform_states, inert_states = _quiescent_compile()
 
-    for i in range(3):
-        print(f"\nStep {i+1}:")
-        example_grid = grid_step(example_grid)
-        print_grid(example_grid)
-        assert example_grid == TEST_GRIDS[i], f"Grid step failed with {example_grid}. Expected: {TEST_GRIDS[i]}" # noqa
-        print("Success!")
+    return {
+        name: "inert" if name in inert_states else "uniform"
+        for name in CELL_STATE_REGISTRY
+        if name in uniform_states
+    }
 
-# ------------------ DEBUG ------------------
+# ------------------ GRID FUNCTIONS ------------------
 
-def debug():
-    # Call the test function
-    print("-" * 20)
-    _test_neighborhood_functions()
-    print("-" * 20)
-    _test_cell_pattern_create()
-    print("-" * 20)
-    _test_cell_state_and_pattern_matching_functions()
-    print("-" * 20)
-    _test_grid_step()
+def _grid_out_check(grid, out) -> None:
+    if out is grid:
+        raise ValueError("Output buffer can not be the grid that is being stepped")
+
+
+def _grid_size(grid: list[list]) -> tuple[int, int]:
+    return len(grid), len(grid[0]) if grid else 0
+
+
+def _boundary_check(boundary: str, height: int, width: int, radius: int | None = None) -> None:
+
+    if boundary not in BOUNDARY_MODES:
+        raise ValueError(f"Invalid boundary mode '{boundary}', expected one of {BOUNDARY_MODES}")
+
+    if boundary == "border":
+        return
+
+    neighborhood_type = _unmapped_neighborhood_type()
+    if neighborhood_type is not None:
+        raise ValueError(
+            f"'{boundary}' boundaries need NEIGHBORHOOD_OFFSETS for the '{neighborhood_type}' neighborhood"
+        )
+
+    # Grids without cells have no edges to wrap or reflect
+    radius = _neighborhood_radius() if radius is None else radius
+    if height and width and radius > min(height, width):
+        raise ValueError(f"Grid is too small for '{boundary}' boundaries with neighborhoods of radius {radius}")
+
+
+def _boundary_index(i: int, size: int, boundary: str) -> int | None:
+
+    # Index inside the grid that position i reads from, None when it is past a border
+    if 0 <= i < size:
+        return i
+    if boundary == "wrap":
+        return i % size
+    if boundary == "reflect":
+        return -i - 1 if i < 0 else 2 * size - i - 1
+    return None
+
+
+def _row_pad(row: list, boundary: str, radius: int) -> list:
+
+    # Radius items taken from the row itself on both ends, also pads a list of rows
+    if boundary == "wrap":
+        return row[-radius:] + row + row[:radius]
+    return row[radius - 1::-1] + row + row[:-radius - 1:-1]
+
+
+def _grid_pad(grid: list[list], boundary: str, radius: int) -> list[list]:
+    return [_row_pad(row, boundary, radius) for row in _row_pad(grid, boundary, radius)]
+
+
+def _grid_unpad(padded: list[list], radius: int, out: list[list] | None = None) -> list[list]:
+
+    rows = [row[radius:-radius] for row in padded[radius:-radius]]
+
+    if out is None:
+        return rows
+
+    for out_row, row in zip(out, rows):
+        out_row[:] = row
+
+    return out
+
+
+def _grid_step_padded(step: Callable, grid: list[list], boundary: str, out: list[list] | None, **kwargs) -> list[list]:
+
+    # Wrapped or reflected edges are stepped as a bordered grid with a halo and cropped afterwards
+    radius = max(1, _neighborhood_radius())
+    return _grid_unpad(step(_grid_pad(grid, boundary, radius), **kwargs), radius, out)
+
+
+def grid_step(grid: list[list], out: list[list] | None = None, boundary: str = "border") -> list[list]:
+
+    _grid_out_check(grid, out)
+    _boundary_check(boundary, *_grid_size(grid))
+
+    # Two state rulesets are stepped a whole row at a time on bit packed rows
+    # Packed and padded grids are rebuilt every call, out only saves the returned grid (grid_run keeps its buffers)
+    if _bitboard_states() is not None:
+        return bitboard_decode(bitboard_step(bitboard_encode(grid), boundary), out)
+
+    if boundary != "border":
+        return _grid_step_padded(grid_step, grid, boundary, out)
+
+    # Create new grid (or write into the given one)
+    new_grid = [[EMPTY_VALUE for _ in range(len(grid[0]))] for _ in range(len(grid))] if out is None else out
+
+    # Generated per state, each neighborhood type is calculated once and only concrete positions are tested
+    matchers = _cell_matchers_compile()
+    quiet_rows = _grid_quiet_rows(grid, _quiescent_compile())
+
+    # Iterate over grid
+    for y, row in enumerate(grid):
+        new_row = new_grid[y]
+
+        if quiet_rows[y]:
+            new_row[:] = row
+            continue
+
+        for x, cell_state_name in enumerate(row):
+            matcher = matchers[cell_state_name]
+            new_row[x] = matcher(grid, x, y) if matcher else cell_state_name
+
+    return new_grid
+
+
+def grid_step_int(grid: list[list[int]], out: list[list[int]] | None = None, boundary: str = "border") -> list[list[int]]:
+
+    _grid_out_check(grid, out)
+    _boundary_check(boundary, *_grid_size(grid))
+
+    if boundary != "border":
+        return _grid_step_padded(grid_step_int, grid, boundary, out)
+
+    new_grid = [[BORDER_ID] * len(grid[0]) for _ in range(len(grid))] if out is None else out
+
+    return _grid_step_int_into(grid, new_grid, _cell_matchers_compile_int(), _quiescent_compile_int())
+
+
+def _gil_disabled() -> bool:
+    # Free threaded builds (3.13+) can run with the GIL turned off, older builds always have it
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def grid_step_threaded(
+    grid: list[list[int]], out: list[list[int]] | None = None, threads: int | None = None, boundary: str = "border"
+) -> list[list[int]]:
+
+    _grid_out_check(grid, out)
+    _boundary_check(boundary, *_grid_size(grid))
+
+    if boundary != "border":
+        return _grid_step_padded(grid_step_threaded, grid, boundary, out, threads=threads)
+
+    # Threads only help without a GIL, by default one thread is used when the GIL is enabled
+    if threads is None:
+        threads = (os.cpu_count() or 1) if _gil_disabled() else 1
+
+    if threads == 1:
+        return grid_step_int(grid, out)
+
+    new_grid = [[BORDER_ID] * len(grid[0]) for _ in range(len(grid))] if out is None else out
+
+    # Compiled in this thread, the workers only read them
+    matchers = _cell_matchers_compile_int()
+    quiet_rows = _grid_quiet_rows(grid, _quiescent_compile_int())
+
+    if threads not in _THREAD_POOLS:
+        _THREAD_POOLS[threads] = ThreadPoolExecutor(threads, thread_name_prefix="calib")
+
+    band_count = min(len(grid), threads)
+    edges = [len(grid) * i // band_count for i in range(band_count + 1)]
+    futures = [
+        _THREAD_POOLS[threads].submit(_grid_step_int_rows, grid, new_grid, matchers, quiet_rows, y0, y1)
+        for y0, y1 in zip(edges, edges[1:])
+    ]
+    for future in futures:
+        future.result()
+
+    return new_grid
+
+
+def _grid_step_int_into(grid: list[list[int]], new_grid: list[list[int]], matchers: list, quiescent: tuple) -> list:
+    return _grid_step_int_rows(grid, new_grid, matchers, _grid_quiet_rows(grid, quiescent), 0, len(grid))
+
+
+def _grid_step_int_rows(
+    grid: list[list[int]], new_grid: list[list[int]], matchers: list, quiet_rows: list[bool], y0: int, y1: int
+) -> list:
+
+    # Only reads grid and only writes rows y0 to y1 of new_grid, so bands can be stepped concurrently
+    for y in range(y0, y1):
+        row, new_row = grid[y], new_grid[y]
+
+        if quiet_rows[y]:
+            new_row[:] = row
+            continue
+
+        for x, state_id in enumerate(row):
+            matcher = matchers[state_id]
+            new_row[x] = matcher(grid, x, y) if matcher else state_id
+
+    return new_grid
+
+
+def grid_run(
+    grid: list[list],
+    steps: int,
+    hook: Callable[[int, list[list]], None] | None = None,
+    hook_every: int = 1,
+    boundary: str = "border",
+) -> list[list]:
+
+    _boundary_check(boundary, *_grid_size(grid))
+
+    if hook_every < 1:
+        raise ValueError(f"hook_every must be at least 1, got {hook_every}")
+
+    # Engine, compiled rules and buffers are set up once, hook gets (generation, grid) every hook_every steps
+    if _bitboard_states() is not None:
+        board = bitboard_encode(grid)
+        for generation in range(1, steps + 1):
+            board = bitboard_step(board, boundary)
+            if hook is not None and generation % hook_every == 0:
+                hook(generation, bitboard_decode(board))
+        return bitboard_decode(board)
+
+    # Neighborhoods without offsets can not be read from a flat halo grid, two int grids are swapped instead
+    if _unmapped_neighborhood_type() is not None:
+        front = grid_encode(grid)
+        back = [row[:] for row in front]
+
+        matchers = _cell_matchers_compile_int()
+        quiescent = _quiescent_compile_int()
+
+        for generation in range(1, steps + 1):
+            _grid_step_int_into(front, back, matchers, quiescent)
+            front, back = back, front
+            if hook is not None and generation % hook_every == 0:
+                hook(generation, grid_decode(front))
+
+        return grid_decode(front)
+
+    # Border ring of both buffers is written once (wrap and reflect refresh it every step), steps only write the interior
+    front = halo_grid_encode(grid_encode(grid))
+    back = HaloGrid(front.cells[:], front.width, front.height, front.radius)
+
+    matchers = _cell_matchers_compile_flat(front.stride)
+    quiescent = _quiescent_compile_int()
+
+    for generation in range(1, steps + 1):
+        _halo_grid_step_into(front, back, matchers, quiescent, boundary)
+        front, back = back, front
+        if hook is not None and generation % hook_every == 0:
+            hook(generation, grid_decode(halo_grid_decode(front)))
+
+    return grid_decode(halo_grid_decode(front))
+
+
+def grid_encode(grid: list[list]) -> list[list[int]]:
+    return [[cell_state_id(cell_state_name) for cell_state_name in row] for row in grid]
+
+
+def grid_decode(grid: list[list[int]]) -> list[list]:
+    return [[STATE_NAMES[state_id] for state_id in row] for row in grid]
+
+
+def grid_iter(
+    grid,
+    steps: int | None = None,
+    until: Callable[[int, object], bool] | None = None,
+    copy: bool = False,
+    boundary: str = "border",
+) -> Iterator:
+
+    # Generations are stepped on demand into two alternating buffers, so without copy a frame is only valid until the
+    # next one is requested (numpy frames are read only views, list frames must not be modified)
+    is_array = np is not None and isinstance(grid, np.ndarray)
+    step = grid_step_numpy if is_array else grid_step
+    front, back = (grid.copy(), np.empty_like(grid)) if is_array else ([row[:] for row in grid], [row[:] for row in grid])
+
+    generation = 0
+    while steps is None or generation < steps:
+        step(front, back, boundary)
+        front, back = back, front
+        generation += 1
+
+        if copy:
+            frame = front.copy() if is_array else [row[:] for row in front]
+        elif is_array:
+            frame = front.view()
+            frame.flags.writeable = False
+        else:
+            frame = front
+
+        yield frame
+
+        # until gets (generation, frame) like the grid_run hook, the frame it returns True for is the last one
+        if until is not None and until(generation, frame):
+            return
+
+# ------------------ HALO GRID FUNCTIONS ------------------
+
+def halo_grid_encode(grid: list[list[int]], radius: int | None = None) -> HaloGrid:
+
+    radius = max(1, _neighborhood_radius()) if radius is None else radius
+    width = _grid_size(grid)[1]
+    stride = width + 2 * radius
+
+    ring = [BORDER_ID] * radius
+    cells = [BORDER_ID] * (stride * radius)
+    for row in grid:
+        cells += ring + row + ring
+    cells += [BORDER_ID] * (stride * radius)
+
+    return HaloGrid(cells, width, len(grid), radius)
+
+
+def halo_grid_decode(halo_grid: HaloGrid) -> list[list[int]]:
+    return [halo_grid.cells[start:start + halo_grid.width] for start in _halo_grid_row_starts(halo_grid)]
+
+
+def _halo_grid_row_starts(halo_grid: HaloGrid) -> range:
+    stride, radius = halo_grid.stride, halo_grid.radius
+    return range(radius * stride + radius, (radius + halo_grid.height) * stride + radius, stride)
+
+
+def _halo_grid_refresh(halo_grid: HaloGrid, boundary: str) -> None:
+
+    # Fills the ring from the interior (or with border), once per step instead of per neighbor access
+    cells, width, height, radius, stride = halo_grid.cells, halo_grid.width, halo_grid.height, halo_grid.radius, halo_grid.stride
+    border_ring = [BORDER_ID] * radius
+
+    for start in _halo_grid_row_starts(halo_grid):
+        end = start + width
+        if boundary == "wrap":
+            cells[start - radius:start] = cells[end - radius:end]
+            cells[end:end + radius] = cells[start:start + radius]
+        elif boundary == "reflect":
+            cells[start - radius:start] = cells[start:start + radius][::-1]
+            cells[end:end + radius] = cells[end - radius:end][::-1]
+        else:
+            cells[start - radius:start] = cells[end:end + radius] = border_ring
+
+    # Ring rows are copied as whole padded rows so the corners come along
+    for k in range(radius):
+        top, bottom = k * stride, (radius + height + k) * stride
+        if boundary == "wrap":
+            cells[top:top + stride] = cells[(height + k) * stride:(height + k + 1) * stride]
+            cells[bottom:bottom + stride] = cells[(radius + k) * stride:(radius + k + 1) * stride]
+        elif boundary == "reflect":
+            cells[top:top + stride] = cells[(2 * radius - 1 - k) * stride:(2 * radius - k) * stride]
+            cells[bottom:bottom + stride] = cells[(radius + height - 1 - k) * stride:(radius + height - k) * stride]
+        else:
+            cells[top:top + stride] = cells[bottom:bottom + stride] = [BORDER_ID] * stride
+
+    halo_grid.ring = boundary
+
+
+def halo_grid_step(halo_grid: HaloGrid, out: HaloGrid | None = None, boundary: str = "border") -> HaloGrid:
+
+    _grid_out_check(halo_grid, out)
+    _boundary_check(boundary, halo_grid.height, halo_grid.width, halo_grid.radius)
+
+    if halo_grid.radius < _neighborhood_radius():
+        raise ValueError("Halo is narrower than the neighborhoods used by the rules")
+
+    if out is None:
+        out = HaloGrid(halo_grid.cells[:], halo_grid.width, halo_grid.height, halo_grid.radius, halo_grid.ring)
+
+    return _halo_grid_step_into(
+        halo_grid, out, _cell_matchers_compile_flat(halo_grid.stride), _quiescent_compile_int(), boundary
+    )
+
+
+def _halo_grid_step_into(
+    halo_grid: HaloGrid, out: HaloGrid, matchers: list, quiescent: tuple, boundary: str = "border"
+) -> HaloGrid:
+
+    if boundary != "border" or halo_grid.ring != "border":
+        _halo_grid_refresh(halo_grid, boundary)
+
+    cells, new_cells, width = halo_grid.cells, out.cells, halo_grid.width
+    starts = _halo_grid_row_starts(halo_grid)
+
+    rows = [cells[start:start + width] for start in starts]
+    quiet_rows = _grid_quiet_rows(rows, quiescent, boundary == "wrap")
+
+    # Interior cells never need bounds checks, only the ring refresh above writes outside the interior
+    for start, row, quiet in zip(starts, rows, quiet_rows):
+        if quiet:
+            new_cells[start:start + width] = row
+            continue
+
+        for i in range(start, start + width):
+            state_id = cells[i]
+            matcher = matchers[state_id]
+            new_cells[i] = matcher(cells, i) if matcher else state_id
+
+    return out
+
+# ------------------ DELTA FUNCTIONS ------------------
+
+def _grid_delta_add_row(delta: GridDelta, y: int, row: list[int], new_row: list[int]) -> None:
+
+    # Rows are compared as a whole first, most rows of a large grid do not change
+    if row != new_row:
+        changed = [x for x, (state_id, new_state_id) in enumerate(zip(row, new_row)) if state_id != new_state_id]
+        delta.xs.extend(changed)
+        delta.ys.extend([y] * len(changed))
+        delta.old_ids.extend([row[x] for x in changed])
+        delta.new_ids.extend([new_row[x] for x in changed])
+
+
+def grid_step_delta(
+    grid: list[list[int]], out: GridDelta | None = None, boundary: str = "border"
+) -> GridDelta:
+
+    _boundary_check(boundary, *_grid_size(grid))
+
+    delta = GridDelta(array("i"), array("i"), array("i"), array("i")) if out is None else out
+    for values in (delta.xs, delta.ys, delta.old_ids, delta.new_ids):
+        del values[:]
+
+    # Wrapped or reflected edges are stepped on a padded copy and compared
+    if boundary != "border":
+        for y, (row, new_row) in enumerate(zip(grid, grid_step_int(grid, boundary=boundary))):
+            _grid_delta_add_row(delta, y, row, new_row)
+        return delta
+
+    # Bordered grids are stepped one row at a time into the same buffer, no new grid is built
+    matchers = _cell_matchers_compile_int()
+    quiet_rows = _grid_quiet_rows(grid, _quiescent_compile_int())
+
+    new_row = [BORDER_ID] * _grid_size(grid)[1]
+
+    for y, row in enumerate(grid):
+        if quiet_rows[y]:
+            continue
+
+        for x, state_id in enumerate(row):
+            matcher = matchers[state_id]
+            new_row[x] = matcher(grid, x, y) if matcher else state_id
+
+        _grid_delta_add_row(delta, y, row, new_row)
+
+    return delta
+
+
+def apply_delta(grid: list[list[int]], delta: GridDelta, reverse: bool = False) -> list[list[int]]:
+
+    # Writes the new states into grid in place, reverse writes the old ones back to undo the step
+    for x, y, state_id in zip(delta.xs, delta.ys, delta.old_ids if reverse else delta.new_ids):
+        grid[y][x] = state_id
+
+    return grid
+
+# ------------------ CYCLE FUNCTIONS ------------------
+
+def _grid_generation_hashes(grid: list[list], max_steps: int, boundary: str) -> Iterator[tuple]:
+
+    # (generation, hash, function returning that generation) for generations 0 to max_steps
+    # Steps are deltas applied in place, so the zobrist hash is only updated for the cells that changed
+    int_grid = grid_encode(grid)
+    grid_hash = grid_zobrist_hash(int_grid)
+    delta = None
+
+    yield 0, grid_hash, lambda: grid
+
+    for generation in range(1, max_steps + 1):
+        delta = grid_step_delta(int_grid, delta, boundary)
+        for x, y, old_id, new_id in zip(delta.xs, delta.ys, delta.old_ids, delta.new_ids):
+            grid_hash ^= _zobrist_key(x, y, old_id) ^ _zobrist_key(x, y, new_id)
+        apply_delta(int_grid, delta)
+
+        yield generation, grid_hash, lambda: grid_decode(int_grid)
+
+
+def grid_find_cycle(grid: list[list], max_steps: int, boundary: str = "border") -> GridCycle | None:
+
+    # Hash of every generation seen so far, stops at the first repeat instead of running all max_steps
+    hashes = {}
+
+    for generation, grid_hash, frame in _grid_generation_hashes(grid, max_steps, boundary):
+        start = hashes.get(grid_hash)
+
+        # A hash match is confirmed by recomputing the earlier generation, on a collision the search just goes on
+        if start is not None:
+            start_grid = grid_run(grid, start, boundary=boundary)
+            if start_grid == frame():
+                frames = [start_grid]
+                for _ in range(generation - start - 1):
+                    frames.append(grid_step(frames[-1], boundary=boundary))
+                return GridCycle(start, generation - start, frames, [row[:] for row in grid], boundary)
+
+        hashes[grid_hash] = generation
+
+    return None
+
+
+def grid_cycle_at(cycle: GridCycle, generation: int) -> list[list]:
+
+    # Generations inside the cycle are looked up without stepping, earlier ones are simulated from generation 0
+    if generation < cycle.start:
+        return grid_run(cycle.grid, generation, boundary=cycle.boundary)
+
+    return [row[:] for row in cycle.frames[(generation - cycle.start) % cycle.period]]
+
+# ------------------ TRANSITION TABLE FUNCTIONS ------------------
+
+def _transition_table_build(state_id: int, state_rules: list, max_size: int) -> TransitionTable | None:
+
+    # Table is indexed over the widest neighborhood used, narrower ones must fit inside it
+    neighborhood_types = {neighborhood_type for neighborhood_type, _, _ in state_rules}
+    neighborhood_type = max(neighborhood_types, key=lambda _t: len(NEIGHBORHOOD_OFFSETS[_t]))
+    offsets = NEIGHBORHOOD_OFFSETS[neighborhood_type]
+
+    if any(not set(NEIGHBORHOOD_OFFSETS[_t]) <= set(offsets) for _t in neighborhood_types):
+        return None
+
+    # Self is always state_id so only the neighbors are part of the index
+    state_count = len(STATE_NAMES)
+    size = state_count ** (len(offsets) - 1)
+
+    if size > max_size:
+        return None
+
+    start = time.perf_counter()
+
+    weights = (0,) + tuple(state_count ** i for i in range(len(offsets) - 1))
+    table = [state_id] * size
+
+    # Fill in reverse so earlier rules overwrite later ones (first match wins)
+    for rule_neighborhood_type, id_pattern, new_state_id in reversed(state_rules):
+
+        values = [WILDCARD_ID] * len(offsets)
+        for offset, value in zip(NEIGHBORHOOD_OFFSETS[rule_neighborhood_type], id_pattern):
+            values[offsets.index(offset)] = value
+
+        indices = [0]
+        for weight, value in zip(weights[1:], values[1:]):
+            choices = range(state_count) if value == WILDCARD_ID else (value,)
+            indices = [index + weight * choice for index in indices for choice in choices]
+
+        for index in indices:
+            table[index] = new_state_id
+
+    return TransitionTable(neighborhood_type, weights, table, time.perf_counter() - start)
+
+
+def _transition_tables_compile(max_size: int) -> list:
+
+    # Indexed by state id, None for states without rules or with a table that would be too large
+    key = ("tables", max_size)
+    tables = _COMPILED_CACHE.get(key)
+
+    if tables is None:
+        tables = [
+            _transition_table_build(state_id, state_rules, max_size) if state_rules else None
+            for state_id, state_rules in enumerate(_rules_compile())
+        ]
+        _COMPILED_CACHE[key] = tables
+
+    return tables
+
+
+def grid_step_table(
+    grid: list[list[int]], max_size: int = TRANSITION_TABLE_MAX_SIZE, boundary: str = "border"
+) -> list[list[int]]:
+
+    _boundary_check(boundary, *_grid_size(grid))
+
+    if boundary != "border":
+        return _grid_step_padded(grid_step_table, grid, boundary, None, max_size=max_size)
+
+    matchers = _cell_matchers_compile_int()
+    tables = _transition_tables_compile(max_size)
+    quiet_rows = _grid_quiet_rows(grid, _quiescent_compile_int())
+
+    new_grid = []
+
+    for y, row in enumerate(grid):
+        if quiet_rows[y]:
+            new_grid.append(row[:])
+            continue
+
+        new_row = []
+        for x, state_id in enumerate(row):
+            table = tables[state_id]
+            if table is not None:
+                neighborhood = NEIGHBORHOODS[table.neighborhood_type](grid, x, y, BORDER_ID)
+                new_row.append(table.table[sum(map(mul, neighborhood, table.weights))])
+            else:
+                matcher = matchers[state_id]
+                new_row.append(matcher(grid, x, y) if matcher else state_id)
+        new_grid.append(new_row)
+
+    return new_grid
+
+
+def transition_table_stats(max_size: int = TRANSITION_TABLE_MAX_SIZE) -> dict:
+
+    rules = _rules_compile()
+    tables = _transition_tables_compile(max_size)
+
+    stats = {}
+    for state_id, table in enumerate(tables):
+        if not rules[state_id]:
+            continue
+        stats[STATE_NAMES[state_id]] = {
+            "rule_count": len(rules[state_id]),
+            "neighborhood_type": table.neighborhood_type if table else None,
+            "size": len(table.table) if table else 0,
+            "build_time": table.build_time if table else 0.0,
+            "fallback": table is None,
+        }
+
+    return stats
+
+# ------------------ DECISION TREE FUNCTIONS ------------------
+
+def _decision_tree_build(state_id: int, state_rules: list):
+
+    # Rules as (tests, new_state_id) where tests are the concrete ((dy, dx), value) pairs, self excluded
+    candidates = tuple(
+        (
+            tuple(
+                (offset, value)
+                for offset, value in zip(NEIGHBORHOOD_OFFSETS[neighborhood_type][1:], id_pattern[1:])
+                if value != WILDCARD_ID
+            ),
+            new_state_id,
+        )
+        for neighborhood_type, id_pattern, new_state_id in state_rules
+    )
+
+    nodes = {}
+
+    def build(candidates):
+
+        # Rules after one without tests can never be reached
+        for i, (tests, _) in enumerate(candidates):
+            if not tests:
+                candidates = candidates[:i + 1]
+                break
+
+        if not candidates:
+            return state_id
+
+        if not candidates[0][0]:
+            return candidates[0][1]
+
+        if candidates in nodes:
+            return nodes[candidates]
+
+        # Test a position of the first rule, prefer the one most other rules also test
+        offset = max(
+            (offset for offset, _ in candidates[0][0]),
+            key=lambda _o: sum(any(o == _o for o, _ in tests) for tests, _ in candidates)
+        )
+
+        values = []
+        for tests, _ in candidates:
+            for o, value in tests:
+                if o == offset and value not in values:
+                    values.append(value)
+
+        branches = {}
+        for value in values:
+            branches[value] = build(tuple(
+                (tuple((o, v) for o, v in tests if o != offset), new_state_id)
+                for tests, new_state_id in candidates
+                if all(v == value for o, v in tests if o == offset)
+            ))
+
+        default = build(tuple(
+            (tests, new_state_id)
+            for tests, new_state_id in candidates
+            if all(o != offset for o, _ in tests)
+        ))
+
+        node = nodes[candidates] = DecisionNode(offset[0], offset[1], branches, default)
+        return node
+
+    return build(candidates)
+
+
+def _decision_trees_compile() -> list:
+
+    # Indexed by state id, each entry is a DecisionNode or the resulting state id
+    trees = _COMPILED_CACHE.get("trees")
+
+    if trees is None:
+        trees = [_decision_tree_build(state_id, state_rules) for state_id, state_rules in enumerate(_rules_compile())]
+        _COMPILED_CACHE["trees"] = trees
+
+    return trees
+
+
+def grid_step_tree(grid: list[list[int]], boundary: str = "border") -> list[list[int]]:
+
+    _boundary_check(boundary, *_grid_size(grid))
+
+    if boundary != "border":
+        return _grid_step_padded(grid_step_tree, grid, boundary, None)
+
+    trees = _decision_trees_compile()
+    quiet_rows = _grid_quiet_rows(grid, _quiescent_compile_int())
+    height, width = _grid_size(grid)
+
+    new_grid = []
+
+    for y, row in enumerate(grid):
+        if quiet_rows[y]:
+            new_grid.append(row[:])
+            continue
+
+        new_row = []
+        for x, state_id in enumerate(row):
+            node = trees[state_id]
+
+            # Every neighbor is inspected at most once on the way down
+            while type(node) is DecisionNode:
+                ny, nx = y + node.dy, x + node.dx
+                value = grid[ny][nx] if 0 <= ny < height and 0 <= nx < width else BORDER_ID
+                node = node.branches.get(value, node.default)
+
+            new_row.append(node)
+        new_grid.append(new_row)
+
+    return new_grid
+
+
+def _decision_tree_nodes(node, depth: int = 0, seen: dict | None = None) -> dict:
+
+    # Unique nodes (the tree is a DAG since identical subtrees are shared) with their deepest depth
+    seen = {} if seen is None else seen
+
+    if type(node) is DecisionNode and seen.get(id(node), (None, -1))[1] < depth:
+        seen[id(node)] = (node, depth)
+        for child in (*node.branches.values(), node.default):
+            _decision_tree_nodes(child, depth + 1, seen)
+
+    return seen
+
+
+def decision_tree_stats() -> dict:
+
+    rules = _rules_compile()
+    stats = {}
+
+    for state_id, tree in enumerate(_decision_trees_compile()):
+        if not rules[state_id]:
+            continue
+
+        nodes = _decision_tree_nodes(tree).values()
+        branching = [len(node.branches) + 1 for node, _ in nodes]
+
+        stats[STATE_NAMES[state_id]] = {
+            "rule_count": len(rules[state_id]),
+            "depth": max((depth + 1 for _, depth in nodes), default=0),
+            "node_count": len(branching),
+            "max_branching": max(branching, default=0),
+            "mean_branching": sum(branching) / len(branching) if branching else 0.0,
+        }
+
+    return stats
+
+
+def decision_tree_print(name: str) -> None:
+
+    def print_node(node, indent):
+        if type(node) is not DecisionNode:
+            print(f"{indent}-> {STATE_NAMES[node]}")
+            return
+
+        for value, child in node.branches.items():
+            print(f"{indent}({node.dx}, {-node.dy}) == {STATE_NAMES[value]}:")
+            print_node(child, indent + "    ")
+        print(f"{indent}else:")
+        print_node(node.default, indent + "    ")
+
+    stats = decision_tree_stats().get(name)
+    print(f"Decision tree of '{name}':", stats)
+    print_node(_decision_trees_compile()[cell_state_id(name)], "    ")
+
+# ------------------ RULE BITSET FUNCTIONS ------------------
+
+def _rule_bitsets_compile() -> list:
+
+    # Indexed by state id, None for states without rules, otherwise (all_rules, tests, new_state_ids) where tests is a
+    # tuple of (dy, dx, value -> bitset of rules accepting it, bitset of rules accepting any value)
+    # Bit r stands for the r-th rule in Cell.rules, so the lowest bit left after ANDing is the first match
+    compiled = _COMPILED_CACHE.get("rule_bitsets")
+
+    if compiled is None:
+        compiled = []
+
+        for state_rules in _rules_compile():
+            if not state_rules:
+                compiled.append(None)
+                continue
+
+            rule_tests = [
+                {
+                    offset: value
+                    for offset, value in zip(NEIGHBORHOOD_OFFSETS[neighborhood_type][1:], id_pattern[1:])
+                    if value != WILDCARD_ID
+                }
+                for neighborhood_type, id_pattern, _ in state_rules
+            ]
+            offsets = list(dict.fromkeys(offset for values in rule_tests for offset in values))
+
+            tests = []
+            for dy, dx in offsets:
+                any_value = sum(1 << rule for rule, values in enumerate(rule_tests) if (dy, dx) not in values)
+                accepts = {}
+                for rule, values in enumerate(rule_tests):
+                    if (dy, dx) in values:
+                        accepts[values[(dy, dx)]] = accepts.get(values[(dy, dx)], any_value) | 1 << rule
+                tests.append((dy, dx, accepts, any_value))
+
+            all_rules = (1 << len(state_rules)) - 1
+            compiled.append((all_rules, tuple(tests), [new_state_id for _, _, new_state_id in state_rules]))
+
+        _COMPILED_CACHE["rule_bitsets"] = compiled
+
+    return compiled
+
+
+def grid_step_bitset(
+    grid: list[list[int]], out: list[list[int]] | None = None, boundary: str = "border"
+) -> list[list[int]]:
+
+    _grid_out_check(grid, out)
+    _boundary_check(boundary, *_grid_size(grid))
+
+    if boundary != "border":
+        return _grid_step_padded(grid_step_bitset, grid, boundary, out)
+
+    bitsets = _rule_bitsets_compile()
+    quiet_rows = _grid_quiet_rows(grid, _quiescent_compile_int())
+    height, width = _grid_size(grid)
+
+    new_grid = [[BORDER_ID] * width for _ in range(height)] if out is None else out
+
+    for y, row in enumerate(grid):
+        new_row = new_grid[y]
+
+        if quiet_rows[y]:
+            new_row[:] = row
+            continue
+
+        for x, state_id in enumerate(row):
+            compiled = bitsets[state_id]
+            if compiled is None:
+                new_row[x] = state_id
+                continue
+
+            # Each neighbor is read once no matter how many rules test it
+            candidates, tests, new_state_ids = compiled
+            for dy, dx, accepts, any_value in tests:
+                ny, nx = y + dy, x + dx
+                value = grid[ny][nx] if 0 <= ny < height and 0 <= nx < width else BORDER_ID
+                candidates &= accepts.get(value, any_value)
+                if not candidates:
+                    break
+
+            new_row[x] = new_state_ids[(candidates & -candidates).bit_length() - 1] if candidates else state_id
+
+    return new_grid
+
+# ------------------ ACTIVE GRID FUNCTIONS ------------------
+
+def _unmapped_neighborhood_type() -> str | None:
+
+    # Neighborhoods added to NEIGHBORHOODS without NEIGHBORHOOD_OFFSETS have no known shape or radius
+    return next((
+        neighborhood_type
+        for cell in CELL_STATE_REGISTRY.values()
+        for neighborhood_type in cell.neighborhood_types
+        if neighborhood_type not in NEIGHBORHOOD_OFFSETS
+    ), None)
+
+
+def _dependent_offsets() -> tuple:
+
+    # Offsets (dy, dx) from a changed cell to every cell whose neighborhood contains it
+    offsets = _COMPILED_CACHE.get("dependent_offsets")
+
+    if offsets is None:
+        offsets = tuple({
+            (-dy, -dx)
+            for cell in CELL_STATE_REGISTRY.values()
+            for neighborhood_type in cell.neighborhood_types
+            for dy, dx in NEIGHBORHOOD_OFFSETS[neighborhood_type]
+        } | {(0, 0)})
+        _COMPILED_CACHE["dependent_offsets"] = offsets
+
+    return offsets
+
+
+def _neighborhood_radius() -> int:
+    return max(max(abs(dy), abs(dx)) for dy, dx in _dependent_offsets())
+
+
+def _zobrist_key(x: int, y: int, state_id: int) -> int:
+
+    # splitmix64 of the cell and its state, so no table of width * height * states random keys is needed
+    z = (((y << 32) | x) * 0x100000001B3 + state_id) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+def grid_zobrist_hash(grid: list[list[int]]) -> int:
+
+    grid_hash = 0
+    for y, row in enumerate(grid):
+        for x, state_id in enumerate(row):
+            grid_hash ^= _zobrist_key(x, y, state_id)
+
+    return grid_hash
+
+
+def active_grid_create(grid: list[list[int]]) -> ActiveGrid:
+    return ActiveGrid(grid, None, hash=grid_zobrist_hash(grid))
+
+
+def active_grid_step(active_grid: ActiveGrid) -> ActiveGrid:
+
+    matchers = _cell_matchers_compile_int()
+    grid = active_grid.grid
+    height, width = _grid_size(grid)
+
+    # Grids without cells have nothing to evaluate
+    if not height or not width:
+        return ActiveGrid(grid, set(), 0.0, matchers, active_grid.hash)
+
+    # Every cell is evaluated on the first step and after the registry changes
+    if active_grid.active is None or active_grid.matchers is not matchers:
+        active = ((x, y) for y in range(height) for x in range(width))
+        active_count = height * width
+    else:
+        active = active_grid.active
+        active_count = len(active)
+
+    changes = []
+    for x, y in active:
+        state_id = grid[y][x]
+        matcher = matchers[state_id]
+        if matcher:
+            new_state_id = matcher(grid, x, y)
+            if new_state_id != state_id:
+                changes.append((x, y, new_state_id))
+
+    # Rows without changes are shared with the previous grid, the hash swaps the old key of a cell for the new one
+    new_grid = list(grid)
+    copied_rows = set()
+    next_active = set()
+    dependent_offsets = _dependent_offsets()
+    grid_hash = active_grid.hash
+
+    for x, y, new_state_id in changes:
+        if y not in copied_rows:
+            copied_rows.add(y)
+            new_grid[y] = list(grid[y])
+        grid_hash ^= _zobrist_key(x, y, grid[y][x]) ^ _zobrist_key(x, y, new_state_id)
+        new_grid[y][x] = new_state_id
+
+        for dy, dx in dependent_offsets:
+            ny, nx = y + dy, x + dx
+            if 0 <= ny < height and 0 <= nx < width:
+                next_active.add((nx, ny))
+
+    return ActiveGrid(new_grid, next_active, active_count / (height * width), matchers, grid_hash)
+
+# ------------------ BITBOARD FUNCTIONS ------------------
+
+def _bitboard_states() -> tuple | None:
+
+    # (off, on) state names when the registry can be stepped as a bitboard, None otherwise
+    names = sorted(CELL_STATE_REGISTRY, key=STATE_IDS.get)
+
+    if len(names) != 2 or BORDER_VALUE in names:
+        return None
+
+    if _unmapped_neighborhood_type() is not None:
+        return None
+
+    # Rules turning a cell into any other state, the border included, need a third value
+    if any(new_state_name not in names for cell in CELL_STATE_REGISTRY.values() for _, new_state_name in cell.rules):
+        return None
+
+    return tuple(names)
+
+
+def _bitboard_rules_compile() -> list:
+
+    # Indexed by bit, each entry is a list of (tests, new_bit) where tests are ((dy, dx), value) pairs
+    # and value is 0 (off), 1 (on) or 2 (border). Rules testing a state that can not occur are dropped
+    rules = _COMPILED_CACHE.get("bitboard")
+
+    if rules is None:
+        states = _bitboard_states()
+        values = {states[0]: 0, states[1]: 1, BORDER_VALUE: 2}
+        rules = [[], []]
+
+        for bit, name in enumerate(states):
+            for pattern, new_state_name in CELL_STATE_REGISTRY[name].rules:
+                tests = tuple(
+                    (offset, values.get(value))
+                    for offset, value in zip(NEIGHBORHOOD_OFFSETS[pattern.neighborhood_type][1:], pattern.pattern[1:])
+                    if value != WILDCARD_VALUE
+                )
+                if all(value is not None for _, value in tests):
+                    rules[bit].append((tests, values[new_state_name]))
+
+        _COMPILED_CACHE["bitboard"] = rules
+
+    return rules
+
+
+def bitboard_encode(grid: list[list]) -> BitBoard:
+
+    states = _bitboard_states()
+    if states is None:
+        raise ValueError("Bitboards need exactly two registered cell states")
+
+    bits = {states[0]: "0", states[1]: "1"}
+
+    # Binary strings are written most significant bit first, so rows are reversed to put x = 0 at bit 0
+    rows = [int("0" + "".join(map(bits.__getitem__, reversed(row))), 2) for row in grid]
+    return BitBoard(rows, len(grid[0]) if grid else 0, states)
+
+
+def bitboard_decode(board: BitBoard, out: list[list] | None = None) -> list[list]:
+
+    names = {"0": board.states[0], "1": board.states[1]}
+
+    # format writes at least one digit, even for rows without cells
+    if board.width == 0:
+        return [[] for _ in board.rows] if out is None else out
+
+    if out is None:
+        return [list(map(names.__getitem__, format(row, f"0{board.width}b")[::-1])) for row in board.rows]
+
+    for out_row, row in zip(out, board.rows):
+        out_row[:] = map(names.__getitem__, format(row, f"0{board.width}b")[::-1])
+
+    return out
+
+
+def _bitboard_shift(row: int, dx: int, width: int, full: int, boundary: str) -> int:
+
+    # Row moved so bit x holds the cell at x + dx, bits past the edge are zero for border
+    if dx >= 0:
+        bits = row >> dx
+        if boundary == "wrap":
+            bits |= (row << (width - dx)) & full
+        elif boundary == "reflect":
+            for x in range(width - dx, width):
+                bits |= ((row >> (2 * width - 1 - x - dx)) & 1) << x
+    else:
+        bits = (row << -dx) & full
+        if boundary == "wrap":
+            bits |= row >> (width + dx)
+        elif boundary == "reflect":
+            for x in range(-dx):
+                bits |= ((row >> (-dx - 1 - x)) & 1) << x
+
+    return bits
+
+
+def bitboard_step(board: BitBoard, boundary: str = "border") -> BitBoard:
+
+    rules = _bitboard_rules_compile()
+    rows, width = board.rows, board.width
+    height = len(rows)
+    full = (1 << width) - 1
+
+    _boundary_check(boundary, height, width)
+
+    # Bits of a row that have a neighbor inside the grid at horizontal offset dx, every bit unless bordered
+    valid_columns = {}
+    for state_rules in rules:
+        for tests, _ in state_rules:
+            for (_, dx), _ in tests:
+                if boundary != "border":
+                    valid_columns[dx] = full
+                else:
+                    valid_columns[dx] = full >> dx if dx >= 0 else (full << -dx) & full
+
+    new_rows = []
+
+    for y, row in enumerate(rows):
+
+        neighbors = {}  # (dy, dx) -> (neighbor bits, valid bits) aligned to this row
+        new_row = row
+
+        for bit, state_rules in enumerate(rules):
+
+            # Cells of this state that no earlier rule has claimed yet (first match wins)
+            unassigned = row if bit else ~row & full
+
+            for tests, new_bit in state_rules:
+                if not unassigned:
+                    break
+
+                mask = unassigned
+                for offset, value in tests:
+
+                    if offset not in neighbors:
+                        dy, dx = offset
+                        ny = _boundary_index(y + dy, height, boundary)
+
+                        if ny is not None:
+                            neighbor_bits = _bitboard_shift(rows[ny], dx, width, full, boundary)
+                            neighbors[offset] = (neighbor_bits, valid_columns[dx])
+                        else:
+                            neighbors[offset] = (0, 0)
+
+                    neighbor_bits, valid = neighbors[offset]
+
+                    if value == 1:
+                        mask &= neighbor_bits & valid
+                    elif value == 0:
+                        mask &= ~neighbor_bits & valid
+                    else:
+                        mask &= ~valid
+
+                    if not mask:
+                        break
+
+                if mask:
+                    unassigned &= ~mask
+                    if new_bit != bit:
+                        new_row = new_row | mask if new_bit else new_row & ~mask
+
+        new_rows.append(new_row)
+
+    return BitBoard(new_rows, width, board.states)
+
+# ------------------ HASHLIFE FUNCTIONS ------------------
+
+def _hashlife_node(cache: HashLifeCache, nw, ne, sw, se) -> QuadNode:
+
+    key = (nw, ne, sw, se)
+    node = cache.nodes.get(key)
+
+    if node is None:
+        level = nw.level + 1 if type(nw) is QuadNode else 1
+        node = cache.nodes[key] = QuadNode(level, nw, ne, sw, se, {})
+
+    return node
+
+
+def _hashlife_border(cache: HashLifeCache, level: int):
+
+    while len(cache.border_nodes) <= level:
+        child = cache.border_nodes[-1]
+        cache.border_nodes.append(_hashlife_node(cache, child, child, child, child))
+
+    return cache.border_nodes[level]
+
+
+def _hashlife_center(cache: HashLifeCache, node: QuadNode) -> QuadNode:
+    return _hashlife_node(cache, node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+
+def _hashlife_base(cache: HashLifeCache, node: QuadNode) -> QuadNode:
+
+    # Level 2 node, the center 2x2 is advanced one generation with the int matchers
+    nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+    grid = [
+        [nw.nw, nw.ne, ne.nw, ne.ne],
+        [nw.sw, nw.se, ne.sw, ne.se],
+        [sw.nw, sw.ne, se.nw, se.ne],
+        [sw.sw, sw.se, se.sw, se.se],
+    ]
+
+    center = []
+    for x, y in ((1, 1), (2, 1), (1, 2), (2, 2)):
+        matcher = cache.matchers[grid[y][x]]
+        center.append(matcher(grid, x, y) if matcher else grid[y][x])
+
+    return _hashlife_node(cache, *center)
+
+
+def _hashlife_successor(cache: HashLifeCache, node: QuadNode, j: int) -> QuadNode:
+
+    # Center of node (one level down) advanced 2^j generations, j is at most node.level - 2
+    result = node.results.get(j)
+    if result is not None:
+        return result
+
+    if node.level == 2:
+        result = _hashlife_base(cache, node)
+    else:
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+
+        # Nine overlapping subnodes one level down
+        n00 = nw
+        n01 = _hashlife_node(cache, nw.ne, ne.nw, nw.se, ne.sw)
+        n02 = ne
+        n10 = _hashlife_node(cache, nw.sw, nw.se, sw.nw, sw.ne)
+        n11 = _hashlife_node(cache, nw.se, ne.sw, sw.ne, se.nw)
+        n12 = _hashlife_node(cache, ne.sw, ne.se, se.nw, se.ne)
+        n20 = sw
+        n21 = _hashlife_node(cache, sw.ne, se.nw, sw.se, se.sw)
+        n22 = se
+
+        subnodes = (n00, n01, n02, n10, n11, n12, n20, n21, n22)
+
+        # At full speed both halves advance 2^(level - 3), otherwise only the second half advances 2^j
+        if j == node.level - 2:
+            r = [_hashlife_successor(cache, n, j - 1) for n in subnodes]
+            j_second = j - 1
+        else:
+            r = [_hashlife_center(cache, n) for n in subnodes]
+            j_second = j
+
+        result = _hashlife_node(
+            cache,
+            _hashlife_successor(cache, _hashlife_node(cache, r[0], r[1], r[3], r[4]), j_second),
+            _hashlife_successor(cache, _hashlife_node(cache, r[1], r[2], r[4], r[5]), j_second),
+            _hashlife_successor(cache, _hashlife_node(cache, r[3], r[4], r[6], r[7]), j_second),
+            _hashlife_successor(cache, _hashlife_node(cache, r[4], r[5], r[7], r[8]), j_second),
+        )
+
+    node.results[j] = result
+    return result
+
+
+def _hashlife_collect(cache: HashLifeCache, root: QuadNode) -> None:
+
+    # Keeps only nodes reachable from root and drops every memoized result
+    reachable = {}
+    stack = [root, *cache.border_nodes[1:]]
+
+    while stack:
+        node = stack.pop()
+        key = (node.nw, node.ne, node.sw, node.se)
+        if reachable.get(key) is node:
+            continue
+        reachable[key] = node
+        node.results.clear()
+        if node.level > 1:
+            stack.extend(key)
+
+    cache.nodes = reachable
+
+
+def _hashlife_build(cache: HashLifeCache, grid: list[list[int]], x: int, y: int, level: int):
+
+    # Square of size 2^level with its top left corner at (x, y), cells outside the grid are border
+    if y >= len(grid) or x >= len(grid[0]):
+        return _hashlife_border(cache, level)
+
+    if level == 0:
+        return grid[y][x]
+
+    half = 1 << (level - 1)
+    return _hashlife_node(
+        cache,
+        _hashlife_build(cache, grid, x, y, level - 1),
+        _hashlife_build(cache, grid, x + half, y, level - 1),
+        _hashlife_build(cache, grid, x, y + half, level - 1),
+        _hashlife_build(cache, grid, x + half, y + half, level - 1),
+    )
+
+
+def hashlife_create(grid: list[list[int]], max_nodes: int = HASHLIFE_MAX_NODES) -> HashLifeWorld:
+
+    rules = _rules_compile()
+
+    if rules[BORDER_ID]:
+        raise ValueError("Hashlife needs the border state to be without rules")
+
+    if _neighborhood_radius() > 1:
+        raise ValueError("Hashlife only supports neighborhoods of radius 1")
+
+    cache = HashLifeCache({}, [BORDER_ID], max_nodes)
+
+    level = 2
+    while (1 << level) < max(len(grid), len(grid[0])):
+        level += 1
+
+    return HashLifeWorld(_hashlife_build(cache, grid, 0, 0, level), len(grid[0]), len(grid), 0, cache)
+
+
+def hashlife_advance(world: HashLifeWorld, generations: int) -> HashLifeWorld:
+
+    cache = world.cache
+    matchers = _cell_matchers_compile_int()
+
+    if cache.matchers is not matchers:
+        _hashlife_collect(cache, world.root)
+        cache.matchers = matchers
+
+    root = world.root
+
+    # Every set bit of generations is one jump of 2^j generations
+    j = 0
+    while generations >> j:
+        if (generations >> j) & 1:
+
+            # Root has to be at least level j + 1 so the padded node is level j + 2
+            while root.level < j + 1:
+                border = _hashlife_border(cache, root.level)
+                root = _hashlife_node(cache, root, border, border, border)
+
+            # Pad with border so the root is the center of a node one level up
+            border = _hashlife_border(cache, root.level - 1)
+            padded = _hashlife_node(
+                cache,
+                _hashlife_node(cache, border, border, border, root.nw),
+                _hashlife_node(cache, border, border, root.ne, border),
+                _hashlife_node(cache, border, root.sw, border, border),
+                _hashlife_node(cache, root.se, border, border, border),
+            )
+            root = _hashlife_successor(cache, padded, j)
+
+            if len(cache.nodes) > cache.max_nodes:
+                _hashlife_collect(cache, root)
+        j += 1
+
+    return HashLifeWorld(root, world.width, world.height, world.generation + generations, cache)
+
+
+def hashlife_to_grid(world: HashLifeWorld) -> list[list[int]]:
+
+    grid = [[BORDER_ID] * world.width for _ in range(world.height)]
+
+    def fill(node, x, y):
+        if x >= world.width or y >= world.height:
+            return
+        if type(node) is not QuadNode:
+            grid[y][x] = node
+            return
+        half = 1 << (node.level - 1)
+        fill(node.nw, x, y)
+        fill(node.ne, x + half, y)
+        fill(node.sw, x, y + half)
+        fill(node.se, x + half, y + half)
+
+    fill(world.root, 0, 0)
+    return grid
+
+# ------------------ SPARSE GRID FUNCTIONS ------------------
+
+def _sparse_neighborhood(offsets: tuple):
+
+    def neighborhood(grid, x, y, border):
+        cells, width, height = grid.cells, grid.width, grid.height
+        return tuple(
+            cells.get((x + dx, y + dy), EMPTY_VALUE) if 0 <= x + dx < width and 0 <= y + dy < height else border
+            for dy, dx in offsets
+        )
+
+    return neighborhood
+
+
+def sparse_grid_create(width: int, height: int, cells: dict | None = None) -> SparseGrid:
+    cells = {} if cells is None else cells
+    return SparseGrid({position: name for position, name in cells.items() if name != EMPTY_VALUE}, width, height)
+
+
+def sparse_grid_from_grid(grid: list[list]) -> SparseGrid:
+    cells = {(x, y): name for y, row in enumerate(grid) for x, name in enumerate(row) if name != EMPTY_VALUE}
+    return SparseGrid(cells, len(grid[0]), len(grid))
+
+
+def sparse_grid_to_grid(sparse_grid: SparseGrid) -> list[list]:
+    grid = [[EMPTY_VALUE] * sparse_grid.width for _ in range(sparse_grid.height)]
+    for (x, y), name in sparse_grid.cells.items():
+        grid[y][x] = name
+    return grid
+
+
+def sparse_grid_step(sparse_grid: SparseGrid) -> SparseGrid:
+
+    # Empty cells away from every occupied cell are only skipped when they can not change
+    if EMPTY_VALUE not in _quiescent_compile()[0]:
+        raise ValueError(f"Sparse grids need '{EMPTY_VALUE}' to stay empty when surrounded by empty cells")
+
+    neighborhoods = {
+        neighborhood_type: _sparse_neighborhood(offsets)
+        for neighborhood_type, offsets in NEIGHBORHOOD_OFFSETS.items()
+    }
+    matchers = _cell_matchers_compile("matchers_sparse", neighborhoods)
+
+    cells, width, height = sparse_grid.cells, sparse_grid.width, sparse_grid.height
+    dependent_offsets = _dependent_offsets()
+
+    # Occupied cells and every cell whose neighborhood contains one
+    candidates = {
+        (x + dx, y + dy)
+        for x, y in cells
+        for dy, dx in dependent_offsets
+        if 0 <= x + dx < width and 0 <= y + dy < height
+    }
+
+    new_cells = {}
+    for x, y in candidates:
+        name = cells.get((x, y), EMPTY_VALUE)
+        matcher = matchers[name]
+        new_name = matcher(sparse_grid, x, y) if matcher else name
+        if new_name != EMPTY_VALUE:
+            new_cells[(x, y)] = new_name
+
+    return SparseGrid(new_cells, width, height)
+
+# ------------------ CHUNK WORLD FUNCTIONS ------------------
+
+def _chunk_world_wake(awake: set, chunk_size: int, x: int, y: int) -> None:
+
+    # A cell changed at world position (x, y), wakes every chunk with a cell depending on it
+    for dy, dx in _dependent_offsets():
+        awake.add(((x + dx) // chunk_size, (y + dy) // chunk_size))
+
+
+def _chunk_padded(world: ChunkWorld, cx: int, cy: int) -> list[list]:
+
+    # Chunk surrounded by a one cell ring copied from its neighbors, so chunk edges see the contiguous world
+    size = world.chunk_size
+    empty_row = [EMPTY_VALUE] * size
+    empty_chunk = [empty_row] * size
+
+    def neighbor(dx, dy):
+        return world.chunks.get((cx + dx, cy + dy), empty_chunk)
+
+    chunk, top, bottom, left, right = neighbor(0, 0), neighbor(0, -1), neighbor(0, 1), neighbor(-1, 0), neighbor(1, 0)
+
+    padded = [[neighbor(-1, -1)[-1][-1], *top[-1], neighbor(1, -1)[-1][0]]]
+    for y in range(size):
+        padded.append([left[y][-1], *chunk[y], right[y][0]])
+    padded.append([neighbor(-1, 1)[0][-1], *bottom[0], neighbor(1, 1)[0][0]])
+
+    return padded
+
+
+def chunk_world_create(cells: dict | None = None, chunk_size: int = CHUNK_SIZE) -> ChunkWorld:
+
+    world = ChunkWorld({}, set(), chunk_size)
+
+    # Every initial cell counts as changed so everything that depends on it is evaluated on the first step
+    for (x, y), name in (cells or {}).items():
+        if name == EMPTY_VALUE:
+            continue
+        key = (x // chunk_size, y // chunk_size)
+        if key not in world.chunks:
+            world.chunks[key] = [[EMPTY_VALUE] * chunk_size for _ in range(chunk_size)]
+        world.chunks[key][y % chunk_size][x % chunk_size] = name
+        _chunk_world_wake(world.awake, chunk_size, x, y)
+
+    return world
+
+
+def chunk_world_from_grid(grid: list[list], chunk_size: int = CHUNK_SIZE) -> ChunkWorld:
+    return chunk_world_create({(x, y): name for y, row in enumerate(grid) for x, name in enumerate(row)}, chunk_size)
+
+
+def chunk_world_to_grid(world: ChunkWorld, x0: int, y0: int, width: int, height: int) -> list[list]:
+
+    size = world.chunk_size
+    grid = []
+
+    for y in range(y0, y0 + height):
+        row = []
+        for x in range(x0, x0 + width):
+            chunk = world.chunks.get((x // size, y // size))
+            row.append(chunk[y % size][x % size] if chunk else EMPTY_VALUE)
+        grid.append(row)
+
+    return grid
+
+
+def chunk_world_step(world: ChunkWorld) -> ChunkWorld:
+
+    # Missing chunks are only skipped safely when empty cells can not change on their own
+    if EMPTY_VALUE not in _quiescent_compile()[0]:
+        raise ValueError(f"Chunk worlds need '{EMPTY_VALUE}' to stay empty when surrounded by empty cells")
+
+    if _neighborhood_radius() > 1:
+        raise ValueError("Chunk worlds only support neighborhoods of radius 1")
+
+    matchers = _cell_matchers_compile()
+    size = world.chunk_size
+
+    # Sleeping chunks are shared with the previous world
+    chunks = dict(world.chunks)
+    awake = set()
+
+    for cx, cy in world.awake:
+        padded = _chunk_padded(world, cx, cy)
+        new_chunk = []
+        occupied = False
+
+        for y in range(1, size + 1):
+            row = padded[y]
+            new_row = []
+            for x in range(1, size + 1):
+                name = row[x]
+                matcher = matchers[name]
+                new_name = matcher(padded, x, y) if matcher else name
+                if new_name != name:
+                    _chunk_world_wake(awake, size, cx * size + x - 1, cy * size + y - 1)
+                new_row.append(new_name)
+            occupied = occupied or new_row.count(EMPTY_VALUE) != size
+            new_chunk.append(new_row)
+
+        # Chunks are created when something is written into them and dropped once they are empty
+        if occupied:
+            chunks[(cx, cy)] = new_chunk
+        else:
+            chunks.pop((cx, cy), None)
+
+    return ChunkWorld(chunks, awake, size)
+
+# ------------------ PARALLEL GRID FUNCTIONS ------------------
+
+_PARALLEL_WORKER = {}  # shared memory blocks attached by a pool worker process
+
+
+def _parallel_worker_init(block_names: list[str], state_names: list[str], snapshot: dict) -> None:
+
+    # Spawned workers start from a fresh import, so the state table and rules are copied in once
+    STATE_NAMES[:] = state_names
+    STATE_IDS.clear()
+    STATE_IDS.update({name: i for i, name in enumerate(state_names)})
+    _registry_restore(snapshot)
+
+    _PARALLEL_WORKER["blocks"] = [shared_memory.SharedMemory(name) for name in block_names]
+
+
+def _parallel_band_step(task: tuple) -> None:
+
+    front, y0, y1, width, height, boundary = task
+    blocks = _PARALLEL_WORKER["blocks"]
+    radius = max(1, _neighborhood_radius())
+
+    # The band plus radius halo rows of its neighbors is all that is read from shared memory
+    rows = []
+    with blocks[front].buf.cast("i") as source:
+        for y in range(y0 - radius, y1 + radius):
+            ny = _boundary_index(y, height, boundary)
+            rows.append(source[ny * width:(ny + 1) * width].tolist() if ny is not None else [BORDER_ID] * width)
+
+    if boundary != "border":
+        rows = [_row_pad(row, boundary, radius) for row in rows]
+
+    new_rows = grid_step_int(rows)[radius:-radius]
+    if boundary != "border":
+        new_rows = [row[radius:-radius] for row in new_rows]
+
+    with blocks[1 - front].buf.cast("i") as target:
+        for y, row in enumerate(new_rows, y0):
+            target[y * width:(y + 1) * width] = array("i", row)
+
+
+def parallel_grid_create(grid: list[list[int]], processes: int | None = None) -> ParallelGrid:
+
+    # Workers copy the registry when the pool starts, rules added afterwards need a new parallel grid
+    height, width = len(grid), len(grid[0])
+    processes = processes or os.cpu_count() or 1
+
+    band_count = min(height, processes)
+    edges = [height * i // band_count for i in range(band_count + 1)]
+
+    # Blocks outlive the process unless unlinked, so they are released again when the setup fails
+    blocks = []
+    try:
+        for _ in range(2):
+            blocks.append(shared_memory.SharedMemory(create=True, size=width * height * array("i").itemsize))
+        with blocks[0].buf.cast("i") as view:
+            view[:] = array("i", [cell for row in grid for cell in row])
+
+        pool = multiprocessing.Pool(
+            processes, _parallel_worker_init, ([block.name for block in blocks], STATE_NAMES[:], _registry_snapshot())
+        )
+    except BaseException:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+
+    return ParallelGrid(width, height, blocks, pool, list(zip(edges, edges[1:])))
+
+
+def parallel_grid_step(parallel_grid: ParallelGrid, steps: int = 1, boundary: str = "border") -> ParallelGrid:
+
+    _boundary_check(boundary, parallel_grid.height, parallel_grid.width)
+
+    # Only (block, band) tuples are sent to the workers, map returning is the barrier between generations
+    for _ in range(steps):
+        tasks = [
+            (parallel_grid.front, y0, y1, parallel_grid.width, parallel_grid.height, boundary)
+            for y0, y1 in parallel_grid.bands
+        ]
+        parallel_grid.pool.map(_parallel_band_step, tasks, chunksize=1)
+        parallel_grid.front = 1 - parallel_grid.front
+
+    return parallel_grid
+
+
+def parallel_grid_to_grid(parallel_grid: ParallelGrid) -> list[list[int]]:
+
+    width = parallel_grid.width
+
+    with parallel_grid.blocks[parallel_grid.front].buf.cast("i") as view:
+        cells = view.tolist()
+
+    return [cells[y * width:(y + 1) * width] for y in range(parallel_grid.height)]
+
+
+def parallel_grid_close(parallel_grid: ParallelGrid) -> None:
+
+    parallel_grid.pool.close()
+    parallel_grid.pool.join()
+
+    for block in parallel_grid.blocks:
+        block.close()
+        block.unlink()
+
+# ------------------ NUMPY FUNCTIONS ------------------
+
+_NUMPY_PAD_MODES = {"wrap": "wrap", "reflect": "symmetric"}
+
+
+def _numpy_require(feature: str) -> None:
+    if np is None:
+        raise ImportError(f"{feature} requires numpy to be installed")
+
+
+def _numpy_step_padded(step: Callable, grid, boundary: str, out):
+
+    # Wrapped or reflected edges are stepped as a bordered array with a halo and cropped afterwards
+    radius = max(1, _neighborhood_radius())
+    padded = np.pad(grid, [(0, 0)] * (grid.ndim - 2) + [(radius, radius)] * 2, mode=_NUMPY_PAD_MODES[boundary])
+    new_grid = step(padded)[..., radius:-radius, radius:-radius]
+
+    if out is None:
+        return new_grid.copy()
+
+    np.copyto(out, new_grid)
+    return out
+
+
+def _numpy_neighbor_views(padded, neighborhood_type: str, y0: int, y1: int, width: int) -> list:
+    return [
+        padded[..., 1 + dy + y0:1 + dy + y1, 1 + dx:1 + dx + width]
+        for dy, dx in NEIGHBORHOOD_OFFSETS[neighborhood_type]
+    ]
+
+
+def _numpy_quiet_rows(grid, quiescent: tuple):
+
+    # Same as _grid_quiet_rows, WILDCARD_ID marks rows that are not uniform
+    # Stacks of grids get one row of results per grid
+    uniform_states, inert_states = _quiet_rows_quiescent(quiescent)
+
+    first = grid[..., 0]
+    row_states = np.where((grid == first[..., None]).all(axis=-1), first, WILDCARD_ID)
+
+    same_above = np.ones(row_states.shape, dtype=bool)
+    same_above[..., 1:] = row_states[..., 1:] == row_states[..., :-1]
+    same_below = np.ones(row_states.shape, dtype=bool)
+    same_below[..., :-1] = row_states[..., :-1] == row_states[..., 1:]
+
+    inert = np.isin(row_states, list(inert_states))
+    uniform = np.isin(row_states, list(uniform_states))
+
+    return inert | (uniform & same_above & same_below)
+
+
+def grid_step_numpy(grid, out=None, boundary: str = "border"):
+
+    _numpy_require("grid_step_numpy")
+    _grid_out_check(grid, out)
+    _boundary_check(boundary, *grid.shape[-2:])
+
+    # Arrays without cells can not be padded and have no rows to find quiet ones in
+    if grid.size == 0:
+        return grid.copy() if out is None else out
+
+    if boundary != "border":
+        return _numpy_step_padded(grid_step_numpy, grid, boundary, out)
+
+    # Leading axes are a stack of independent grids, every rule is still one mask over the whole stack
+    rules = _rules_compile()
+    height, width = grid.shape[-2:]
+
+    if out is None:
+        new_grid = grid.copy()
+    else:
+        new_grid = out
+        np.copyto(new_grid, grid)
+
+    # Only the band of rows between the first and last row that is not quiet in some grid gets evaluated
+    quiet_rows = _numpy_quiet_rows(grid, _quiescent_compile_int()).reshape(-1, height).all(axis=0)
+    active_rows = np.flatnonzero(~quiet_rows)
+    if len(active_rows) == 0:
+        return new_grid
+
+    y0, y1 = active_rows[0], active_rows[-1] + 1
+    band = grid[..., y0:y1, :]
+
+    padded = np.pad(grid, [(0, 0)] * (grid.ndim - 2) + [(1, 1), (1, 1)], constant_values=BORDER_ID)
+    views = {}
+
+    for state_id, state_rules in enumerate(rules):
+        if not state_rules:
+            continue
+
+        # Cells of this state that no earlier rule has claimed yet (first match wins)
+        unassigned = band == state_id
+
+        for neighborhood_type, id_pattern, new_state_id in state_rules:
+            if neighborhood_type not in views:
+                views[neighborhood_type] = _numpy_neighbor_views(padded, neighborhood_type, y0, y1, width)
+
+            # Position 0 is the cell itself which is already known to be state_id
+            mask = unassigned.copy()
+            for view, value in zip(views[neighborhood_type][1:], id_pattern[1:]):
+                if value != WILDCARD_ID:
+                    mask &= view == value
+
+            new_grid[..., y0:y1, :][mask] = new_state_id
+            unassigned &= ~mask
+
+    return new_grid
+
+
+def ensemble_step(grids, out=None, boundary: str = "border"):
+
+    # A 3D array of state ids is a stack of grids, stepped with one vectorized pass per rule
+    if not isinstance(grids, list):
+        _numpy_require("ensemble_step")
+        if grids.ndim != 3:
+            raise ValueError(f"Expected a 3D array of grids, got {grids.ndim} dimensions")
+        return grid_step_numpy(grids, out, boundary)
+
+    # Lists of grids of state names are stacked for the same pass, or stepped one by one without numpy
+    if np is None:
+        new_grids = [grid_step(grid, boundary=boundary) for grid in grids]
+    else:
+        stack = np.array([grid_encode(grid) for grid in grids])
+        new_grids = [grid_decode(grid) for grid in grid_step_numpy(stack, boundary=boundary).tolist()]
+
+    if out is None:
+        return new_grids
+
+    for out_grid, new_grid in zip(out, new_grids):
+        for out_row, row in zip(out_grid, new_grid):
+            out_row[:] = row
+
+    return out
+
+# ------------------ JIT FUNCTIONS ------------------
+
+def _jit_rules_compile() -> tuple:
+
+    # Flat int64 arrays the kernel can read in nopython mode: rules of state s are rule_start[s]:rule_start[s + 1]
+    # in first match order, their neighbor tests are test_start[r]:test_start[r + 1], wildcards get no test
+    compiled = _COMPILED_CACHE.get("jit_rules")
+
+    if compiled is None:
+        rule_start, rule_new, test_start, test_dy, test_dx, test_value = [0], [], [0], [], [], []
+
+        for state_rules in _rules_compile():
+            for neighborhood_type, id_pattern, new_state_id in state_rules:
+                for (dy, dx), value in zip(NEIGHBORHOOD_OFFSETS[neighborhood_type][1:], id_pattern[1:]):
+                    if value != WILDCARD_ID:
+                        test_dy.append(dy)
+                        test_dx.append(dx)
+                        test_value.append(value)
+                test_start.append(len(test_value))
+                rule_new.append(new_state_id)
+            rule_start.append(len(rule_new))
+
+        compiled = tuple(np.array(values, dtype=np.int64) for values in (
+            rule_start, rule_new, test_start, test_dy, test_dx, test_value
+        ))
+        _COMPILED_CACHE["jit_rules"] = compiled
+
+    return compiled
+
+
+def _jit_kernel(grid, new_grid, quiet_rows, rule_start, rule_new, test_start, test_dy, test_dx, test_value):
+
+    height, width = grid.shape
+
+    for y in range(height):
+        if quiet_rows[y]:
+            new_grid[y, :] = grid[y, :]
+            continue
+
+        for x in range(width):
+            state_id = grid[y, x]
+            new_state_id = state_id
+
+            for rule in range(rule_start[state_id], rule_start[state_id + 1]):
+                matched = True
+                for test in range(test_start[rule], test_start[rule + 1]):
+                    ny, nx = y + test_dy[test], x + test_dx[test]
+                    neighbor = grid[ny, nx] if 0 <= ny < height and 0 <= nx < width else BORDER_ID
+                    if neighbor != test_value[test]:
+                        matched = False
+                        break
+
+                if matched:
+                    new_state_id = rule_new[rule]
+                    break
+
+            new_grid[y, x] = new_state_id
+
+
+def _jit_kernel_load():
+
+    if "kernel" not in _JIT:
+        try:
+            import numba
+        except ImportError:  # numba is optional, grid_step_jit falls back to the numpy backend without it
+            _JIT["kernel"] = None
+        else:
+            # Compiled on the first call, cache=True stores the machine code in __pycache__ for later processes
+            _JIT["kernel"] = numba.njit(cache=True)(_jit_kernel)
+
+    return _JIT["kernel"]
+
+
+def grid_step_jit(grid, out=None, boundary: str = "border"):
+
+    _numpy_require("grid_step_jit")
+
+    # Without numba the vectorized numpy backend is the fastest pure Python option,
+    # it also steps stacks of grids the kernel is not compiled for
+    kernel = _jit_kernel_load()
+    if kernel is None or grid.ndim != 2:
+        return grid_step_numpy(grid, out, boundary)
+
+    _grid_out_check(grid, out)
+    _boundary_check(boundary, *grid.shape)
+
+    if grid.size == 0:
+        return grid.copy() if out is None else out
+
+    if boundary != "border":
+        return _numpy_step_padded(grid_step_jit, grid, boundary, out)
+
+    new_grid = np.empty_like(grid) if out is None else out
+    quiet_rows = _numpy_quiet_rows(grid, _quiescent_compile_int())
+
+    kernel(grid, new_grid, quiet_rows, *_jit_rules_compile())
+
+    return new_grid
+
+# ------------------ UTILS ------------------
+
+def cell_pattern_create(rule_parts: dict, neighborhood_type: Literal["moore", "von_neumann"]) -> Pattern:
+
+    empty_pattern = []
+    positions = []
+
+    if (0, 0) not in rule_parts.keys():
+        raise ValueError("Rule must contain (0, 0) offset (self)")
+
+    # Get position (list containting index information of offsets and length of pattern)
+    match(neighborhood_type):
+        case "moore":
+            positions = [(0, 0), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+        case "von_neumann":
+            positions = [(0, 0), (0, 1), (1, 0), (0, -1), (-1, 0)]
+        case _:
+            raise ValueError("Invalid neighborhood type")
+
+    # Create new empty pattern
+    new_pattern = [WILDCARD_VALUE for _ in positions]
+
+    for offset, state_id in rule_parts.items():
+        if offset in positions:
+            index = positions.index(offset)
+            new_pattern[index] = state_id
+
+    return Pattern(new_pattern, neighborhood_type)
+
+
+def _registry_snapshot() -> dict:
+    return {
+        name: Cell(cell.name, list(cell.rules), dict(cell.data), list(cell.neighborhood_types))
+        for name, cell in CELL_STATE_REGISTRY.items()
+    }
+
+
+def _registry_restore(snapshot: dict) -> None:
+    # State ids are kept, only the registered cells and compiled forms are replaced
+    CELL_STATE_REGISTRY.clear()
+    CELL_STATE_REGISTRY.update(snapshot)
+    _COMPILED_CACHE.clear()
+
+
+def print_grid(grid):
+    for row in grid:
+        print(row)
+
+# ------------------ NEIGHBORHOOD FUNCTIONS ------------------
+
+def _get_moore_neighborhood(arr, x, y, border=BORDER_VALUE):
+    return (
+        arr[y][x],
+        arr[y - 1][x] if y > 0 else border,
+        arr[y - 1][x + 1] if y > 0 and x < len(arr[y]) - 1 else border,
+        arr[y][x + 1] if x < len(arr[y]) - 1 else border,
+        arr[y + 1][x + 1] if y < len(arr) - 1 and x < len(arr[y]) - 1 else border,
+        arr[y + 1][x] if y < len(arr) - 1 else border,
+        arr[y + 1][x - 1] if y < len(arr) - 1 and x > 0 else border,
+        arr[y][x - 1] if x > 0 else border,
+        arr[y - 1][x - 1] if y > 0 and x > 0 else border
+    )
+NEIGHBORHOODS["moore"] = _get_moore_neighborhood
+NEIGHBORHOOD_OFFSETS["moore"] = ((0, 0), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+def _get_von_neuman_neighborhood(arr, x, y, border=BORDER_VALUE):
+    return (
+        arr[y][x],
+        arr[y - 1][x] if y > 0 else border,
+        arr[y][x + 1] if x < len(arr[y]) - 1 else border,
+        arr[y + 1][x] if y < len(arr) - 1 else border,
+        arr[y][x - 1] if x > 0 else border,
+    )
+NEIGHBORHOODS["von_neumann"] = _get_von_neuman_neighborhood
+NEIGHBORHOOD_OFFSETS["von_neumann"] = ((0, 0), (-1, 0), (0, 1), (1, 0), (0, -1))
+
+# ------------------ TESTS ------------------
+
+def _test_neighborhood_functions():
+
+    TEST_RESULT_MOORE = ("5", "2", "3", "6", "9", "8", "7", "4", "1")
+    TEST_RESULT_VON_NEUMANN = ("5", "2", "6", "8", "4")
+
+    # Sample grid
+    grid = [
+        ["1", "2", "3"],
+        ["4", "5", "6"],
+        ["7", "8", "9"]
+    ]
+
+    # Test coordinates
+    x, y = 1, 1
+
+    print("Grid:")
+    print_grid(grid)
+
+    print("Coordinates:", x, y)
+
+    res = []
+    for _t, func in NEIGHBORHOODS.items():
+        neighborhood = func(grid, x, y)
+        print(f"{_t.capitalize()} Result:", neighborhood)
+        res.append(neighborhood)
+
+    assert res[0] == TEST_RESULT_MOORE, f"Moore neighborhood function failed with {res[0]}. Expected: {TEST_RESULT_MOORE}" # noqa
+    assert res[1] == TEST_RESULT_VON_NEUMANN, f"Von Neumann neighborhood function failed with {res[1]}. Expected: {TEST_RESULT_VON_NEUMANN}" # noqa
+
+
+def _test_cell_pattern_create():
+
+    TEST_PATTERN = Pattern(["self", "1", "2", "3", "4", "5", "6", "7", "8"], "moore")
+
+    # Sample rule
+    rule = {
+        (0, 0): "self",
+        (0, 1): "1",
+        (1, 1): "2",
+        (1, 0): "3",
+        (1, -1): "4",
+        (0, -1): "5",
+        (-1, -1): "6",
+        (-1, 0): "7",
+        (-1, 1): "8",
+    }
+
+    # Sample neighborhood type
+    neighborhood_type = "moore"
+
+    pattern = cell_pattern_create(rule, neighborhood_type)
+
+    assert pattern == TEST_PATTERN, f"Pattern creation util failed with {pattern}. Expected: {TEST_PATTERN}"
+
+    print("Pattern:", pattern)
+
+
+def _test_cell_state_and_pattern_matching_functions():
+
+    # Create cell states
+    cell_state_register("empty", color=(0, 0, 0))
+    cell_state_register("sand", color=(255, 255, 0))
+
+    assert CELL_STATE_REGISTRY["sand"] == Cell("sand", [], {"color": (255, 255, 0)})
+
+    # Add rule (for converting sand with empty below it to empty since sand falls)
+    pattern = cell_pattern_create(
+        rule_parts={
+            (0, 00): "sand",  # self (sand)
+            (0, -1): "empty",  # bottom (empty)
+        },
+        neighborhood_type="moore"
+    )
+
+    cell_state_add_new_rule(pattern, "empty")
+
+    # Add rule (for converting empty with sand above it to sand since sand falls)
+    pattern = cell_pattern_create(
+        rule_parts={
+            (0, 0): "empty",  # self (empty)
+            (0, 1): "sand",  # top (sand)
+        },
+        neighborhood_type="moore"
+    )
+
+    cell_state_add_new_rule(pattern, "sand")
+
+    print("Cell State Registry:", CELL_STATE_REGISTRY)
+
+    example_grid = [
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "sand", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+    ]
+
+    print("Example Grid:")
+    print_grid(example_grid)
+
+    # Check if pattern matches at (1, 2)
+    print("\nChecking if pattern matches at (1, 2)")
+    neighborhood = NEIGHBORHOODS["moore"](example_grid, 1, 2)
+    print("Neighborhood:", neighborhood)
+    assert _cell_pattern_match(pattern, neighborhood), f"Pattern matching failed with {neighborhood}. Expected: {pattern}" # noqa
+    print("Success!")
+
+    # Check if pattern does not match at (0, 0)
+    print("\nChecking if pattern does not match at (0, 0)")
+    neighborhood = neighborhood = NEIGHBORHOODS["moore"](example_grid, 0, 0)
+    print("Neighborhood:", neighborhood)
+    assert not _cell_pattern_match(pattern, neighborhood), f"Pattern matching failed with {neighborhood}. Expected: {pattern}" # noqa
+    print("Success!")
+
+def _test_grid_step():
+    example_grid = [
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "sand", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+    ]
+
+    TEST_STEP_1_GRID = [
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "sand", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+    ]
+
+    TEST_STEP_2_AND_3_GRID = [
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "sand", "empty", "empty"],
+    ]
+
+    TEST_GRIDS = [TEST_STEP_1_GRID, TEST_STEP_2_AND_3_GRID, TEST_STEP_2_AND_3_GRID]
+
+    print("Testing grid step watch if the sand falls")
+
+    print("Example Grid:")
+    print_grid(example_grid)
+
+    for i in range(3):
+        print(f"\nStep {i+1}:")
+        example_grid = grid_step(example_grid)
+        print_grid(example_grid)
+        assert example_grid == TEST_GRIDS[i], f"Grid step failed with {example_grid}. Expected: {TEST_GRIDS[i]}" # noqa
+        print("Success!")
+
+def _test_grid_step_int():
+    example_grid = [
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "sand", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+        ["empty", "empty", "empty", "empty"],
+    ]
+
+    print("State Ids:", STATE_IDS)
+
+    assert STATE_NAMES[BORDER_ID] == BORDER_VALUE
+    assert cell_pattern_compile(Pattern(["sand", "*", "empty"], "moore")) == (STATE_IDS["sand"], WILDCARD_ID, STATE_IDS["empty"]) # noqa
+
+    int_grid = grid_encode(example_grid)
+    print("Encoded Grid:")
+    print_grid(int_grid)
+    assert grid_decode(int_grid) == example_grid, "Encoding round trip failed"
+
+    for i in range(3):
+        print(f"\nStep {i+1}:")
+        expected_grid = grid_step(example_grid)
+        int_grid = grid_step_int(int_grid)
+        example_grid = grid_decode(int_grid)
+        print_grid(int_grid)
+        assert example_grid == expected_grid, f"Int grid step failed with {example_grid}. Expected: {expected_grid}" # noqa
+        print("Success!")
+
+def _test_random_grid(width, height, seed=0, states=("empty", "sand")):
+    import random
+    rng = random.Random(seed)
+    return [[rng.choice(states) for _ in range(width)] for _ in range(height)]
+
+
+def _test_grid_step_numpy():
+
+    if np is None:
+        print("numpy is not installed, skipping")
+        return
+
+    example_grid = _test_random_grid(24, 16, seed=1)
+    array = np.array(grid_encode(example_grid))
+
+    print("Testing numpy backend against grid_step on a random 24x16 grid")
+
+    for i in range(5):
+        example_grid = grid_step(example_grid)
+        array = grid_step_numpy(array)
+        assert grid_decode(array.tolist()) == example_grid, f"Numpy grid step failed at step {i+1}"
+
+    print("Success!")
+
+def _test_grid_step_jit():
+
+    if np is None:
+        print("numpy is not installed, skipping")
+        return
+
+    kernel = _jit_kernel_load()
+    print(f"Testing jit backend {'' if kernel is not None else '(numba not installed) '}against grid_step_int")
+
+    int_grid = grid_encode(_test_random_grid(24, 16, seed=19))
+
+    # Also with the uncompiled kernel, which runs the same code as plain Python
+    for _JIT["kernel"] in {kernel, _jit_kernel if kernel is not None else None}:
+        for boundary in BOUNDARY_MODES:
+            array = np.array(int_grid)
+            expected_grid = int_grid
+            for i in range(4):
+                expected_grid = grid_step_int(expected_grid, boundary=boundary)
+                array = grid_step_jit(array, boundary=boundary)
+                assert array.tolist() == expected_grid, f"'{boundary}' jit grid step failed at step {i+1}"
+
+    _JIT["kernel"] = kernel
+
+    out = np.zeros((16, 24), dtype=np.int64)
+    assert grid_step_jit(np.array(int_grid), out) is out, "Output buffer was not used"
+    assert out.tolist() == grid_step_int(int_grid), "Output buffer has the wrong cells"
+
+    stack = np.array([int_grid, grid_step_int(int_grid)])
+    for boundary in BOUNDARY_MODES:
+        expected_grids = [grid_step_int(grid, boundary=boundary) for grid in stack.tolist()]
+        assert grid_step_jit(stack, boundary=boundary).tolist() == expected_grids, f"'{boundary}' stack failed"
+
+    print("Success!")
+
+def _test_ensemble_step():
+
+    print("Testing ensemble_step against grid_step on 6 random 12x9 grids")
+
+    for boundary in BOUNDARY_MODES:
+        grids = [_test_random_grid(12, 9, seed=seed) for seed in range(6)]
+        grids[2] = [["empty"] * 12 for _ in range(9)]  # Quiet everywhere, the others still have to be stepped
+
+        stack = np.array([grid_encode(grid) for grid in grids]) if np is not None else None
+
+        for i in range(4):
+            expected_grids = [grid_step(grid, boundary=boundary) for grid in grids]
+            grids = ensemble_step(grids, boundary=boundary)
+            assert grids == expected_grids, f"'{boundary}' list ensemble failed at step {i+1}"
+
+            if stack is not None:
+                stack = ensemble_step(stack, boundary=boundary)
+                stack_grids = [grid_decode(grid) for grid in stack.tolist()]
+                assert stack_grids == expected_grids, f"'{boundary}' array ensemble failed at step {i+1}"
+
+    out = [[[EMPTY_VALUE] * 12 for _ in range(9)] for _ in range(6)]
+    assert ensemble_step(grids, out) is out and out == [grid_step(grid) for grid in grids], "Output grids were not filled"
+
+    print("Success!")
+
+def _test_grid_step_table():
+
+    example_grid = _test_random_grid(24, 16, seed=2)
+
+    print("Transition Table Stats:", transition_table_stats())
+    assert transition_table_stats()["sand"]["size"] == len(STATE_NAMES) ** 8
+    assert transition_table_stats(max_size=1)["sand"]["fallback"], "Table should fall back when too large"
+
+    print("Testing transition tables (and fallback) against grid_step on a random 24x16 grid")
+
+    table_grid = fallback_grid = grid_encode(example_grid)
+    for i in range(5):
+        example_grid = grid_step(example_grid)
+        table_grid = grid_step_table(table_grid)
+        fallback_grid = grid_step_table(fallback_grid, max_size=1)
+        assert grid_decode(table_grid) == example_grid, f"Table grid step failed at step {i+1}"
+        assert grid_decode(fallback_grid) == example_grid, f"Fallback grid step failed at step {i+1}"
+
+    print("Success!")
+
+def _test_cell_matchers():
+
+    matchers = _cell_matchers_compile()
+    print("Sand Matcher:")
+    print(matchers["sand"].source)
+
+    # Only the bottom position is concrete in the sand rule
+    assert "n0[5] == 'empty'" in matchers["sand"].source
+    assert "n0[1]" not in matchers["sand"].source
+
+    example_grid = [
+        ["sand", "empty"],
+        ["empty", "empty"],
+    ]
+
+    snapshot = _registry_snapshot()
+
+    # Matchers get regenerated when a rule is added, sand next to the border turns into empty
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "sand", (-1, 0): "border"}, "von_neumann"), "empty")
+    assert _cell_matchers_compile() is not matchers, "Matchers were not regenerated"
+    assert grid_step(example_grid) == [["empty", "empty"], ["sand", "empty"]]
+
+    _registry_restore(snapshot)
+
+    example_grid = _test_random_grid(24, 16, seed=3)
+    int_grid = grid_encode(example_grid)
+    for i in range(5):
+        example_grid = grid_step(example_grid)
+        int_grid = grid_step_int(int_grid)
+        assert grid_decode(int_grid) == example_grid, f"Int matchers failed at step {i+1}"
+
+    print("Success!")
+
+def _test_grid_step_tree():
+
+    decision_tree_print("sand")
+    assert decision_tree_stats()["sand"] == {
+        "rule_count": 1, "depth": 1, "node_count": 1, "max_branching": 2, "mean_branching": 2.0
+    }
+
+    example_grid = _test_random_grid(24, 16, seed=4)
+    int_grid = grid_encode(example_grid)
+    for i in range(5):
+        example_grid = grid_step(example_grid)
+        int_grid = grid_step_tree(int_grid)
+        assert grid_decode(int_grid) == example_grid, f"Decision tree grid step failed at step {i+1}"
+
+    print("Success!")
+
+def _test_grid_step_bitset():
+
+    print("Testing rule bitsets against grid_step_int on a random 24x16 grid")
+
+    snapshot = _registry_snapshot()
+
+    # Overlapping rules with wildcards and mixed neighborhoods, the first matching one has to win
+    cell_state_register("stone", color=(128, 128, 128))
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "stone", (0, 1): "sand", (1, 0): "sand"}, "moore"), "empty")
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "stone", (0, 1): "sand"}, "von_neumann"), "sand")
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "stone", (-1, -1): "border"}, "moore"), "sand")
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "stone"}, "moore"), "stone")
+
+    int_grid = grid_encode(_test_random_grid(24, 16, seed=20, states=("empty", "sand", "stone")))
+
+    for boundary in BOUNDARY_MODES:
+        expected_grid = new_grid = int_grid
+        for i in range(5):
+            expected_grid = grid_step_int(expected_grid, boundary=boundary)
+            new_grid = grid_step_bitset(new_grid, boundary=boundary)
+            assert new_grid == expected_grid, f"'{boundary}' bitset grid step failed at step {i+1}"
+
+    stone_id = cell_state_id("stone")
+    all_rules, tests, new_state_ids = _rule_bitsets_compile()[stone_id]
+    assert all_rules == 0b1111 and len(new_state_ids) == 4, "Wrong rule bits"
+    any_values = {(dy, dx): any_value for dy, dx, _, any_value in tests}
+    assert any_values == {(-1, 0): 0b1100, (0, 1): 0b1110, (1, -1): 0b1011}, "Wrong bitsets of rules accepting any value"
+
+    _registry_restore(snapshot)
+
+    print("Success!")
+
+def _test_active_grid():
+
+    example_grid = _test_random_grid(24, 16, seed=5)
+    active_grid = active_grid_create(grid_encode(example_grid))
+
+    print("Testing active cell stepping against grid_step on a random 24x16 grid")
+
+    for i in range(20):
+        example_grid = grid_step(example_grid)
+        active_grid = active_grid_step(active_grid)
+        print(f"Step {i+1} active ratio: {active_grid.active_ratio:.3f}")
+        assert grid_decode(active_grid.grid) == example_grid, f"Active grid step failed at step {i+1}"
+        assert active_grid.hash == grid_zobrist_hash(active_grid.grid), f"Incremental hash failed at step {i+1}"
+
+    assert active_grid.active_ratio < 1.0, "Active cell tracking did not skip any cells"
+
+    # The sand has settled, so the hash stays the same while a changed cell changes it
+    settled_hash = active_grid.hash
+    assert active_grid_step(active_grid).hash == settled_hash, "Hash changed without changes"
+    active_grid.grid[0][0] = cell_state_id("sand" if active_grid.grid[0][0] != cell_state_id("sand") else "empty")
+    assert grid_zobrist_hash(active_grid.grid) != settled_hash, "Hash did not change with the grid"
+
+    for empty_grid in ([], [[]], [[], []]):
+        assert active_grid_step(active_grid_create(empty_grid)).grid == empty_grid, f"{empty_grid} failed"
+
+    print("Success!")
+
+def _test_quiescent_states():
+
+    print("Quiescent States:", quiescent_states())
+    assert quiescent_states() == {"empty": "uniform", "sand": "uniform"}
+
+    example_grid = [
+        ["empty", "empty", "empty"],
+        ["empty", "empty", "empty"],
+        ["empty", "sand", "empty"],
+        ["empty", "empty", "empty"],
+        ["sand", "sand", "sand"],
+        ["sand", "sand", "sand"],
+    ]
+
+    quiet_rows = _grid_quiet_rows(example_grid, _quiescent_compile())
+    print("Quiet Rows:", quiet_rows)
+    assert quiet_rows == [True, False, False, False, False, True]
+    assert _grid_quiet_rows(grid_encode(example_grid), _quiescent_compile_int()) == quiet_rows
+    assert _grid_quiet_rows([[], []], _quiescent_compile()) == [False, False], "Empty rows failed"
+
+    if np is not None:
+        assert _numpy_quiet_rows(np.array(grid_encode(example_grid)), _quiescent_compile_int()).tolist() == quiet_rows
+
+    # Sky above and settled sand below, only the middle rows change
+    example_grid = _test_random_grid(16, 8, seed=6)
+    example_grid = [["empty"] * 16] * 6 + example_grid + [["sand"] * 16] * 6
+    int_grid = grid_encode(example_grid)
+    array = np.array(int_grid) if np is not None else None
+
+    for i in range(10):
+        example_grid = grid_step(example_grid)
+        int_grid = grid_step_int(int_grid)
+        assert grid_decode(int_grid) == example_grid, f"Int grid step with quiet rows failed at step {i+1}"
+        if array is not None:
+            array = grid_step_numpy(array)
+            assert grid_decode(array.tolist()) == example_grid, f"Numpy grid step with quiet rows failed at step {i+1}"
+
+    print("Success!")
+
+def _test_bitboard():
+
+    assert _bitboard_states() == ("empty", "sand")
+
+    example_grid = _test_random_grid(70, 16, seed=7)
+    board = bitboard_encode(example_grid)
+    assert bitboard_decode(board) == example_grid, "Bitboard round trip failed"
+
+    print("Testing bitboard against grid_step_int on a random 70x16 grid")
+
+    int_grid = grid_encode(example_grid)
+    for i in range(5):
+        int_grid = grid_step_int(int_grid)
+        board = bitboard_step(board)
+        assert bitboard_decode(board) == grid_decode(int_grid), f"Bitboard step failed at step {i+1}"
+
+    # Game of life, births and survivals spelled out as patterns with a catch all death rule last
+    from itertools import combinations
+
+    snapshot = _registry_snapshot()
+    _registry_restore({})
+
+    cell_state_register("dead")
+    cell_state_register("alive")
+
+    positions = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+    for state, counts, new_state in (("dead", (3,), "alive"), ("alive", (2, 3), "alive")):
+        for count in counts:
+            for alive in combinations(positions, count):
+                rule_parts = {position: "alive" if position in alive else "dead" for position in positions}
+                rule_parts[(0, 0)] = state
+                cell_state_add_new_rule(cell_pattern_create(rule_parts, "moore"), new_state)
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "alive"}, "moore"), "dead")
+
+    blinker = [["dead"] * 5 for _ in range(5)]
+    for x in (1, 2, 3):
+        blinker[2][x] = "alive"
+
+    print("Blinker:")
+    print_grid(blinker)
+
+    life_grid = grid_step(blinker)
+    print_grid(life_grid)
+    assert life_grid == grid_decode(grid_step_int(grid_encode(blinker))), "Bitboard life step failed"
+    assert life_grid != blinker and grid_step(life_grid) == blinker, "Blinker did not oscillate"
+
+    for empty_grid in ([], [[]], [[], []]):
+        assert bitboard_decode(bitboard_step(bitboard_encode(empty_grid))) == empty_grid, f"{empty_grid} failed"
+
+    # Two states whose rules lead to a third one are not stepped as a bitboard
+    _registry_restore({})
+    cell_state_register("empty")
+    cell_state_register("sand")
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "sand", (0, -1): "empty"}, "von_neumann"), "border")
+    assert _bitboard_states() is None, "Rule leading to the border state was stepped as a bitboard"
+
+    example_grid = [["empty", "sand"], ["sand", "empty"]]
+    assert grid_step(example_grid) == [["empty", "border"], ["sand", "empty"]], "Rule leading to the border failed"
+
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "empty", (0, 1): "sand", (0, -1): "sand"}, "von_neumann"), "ghost")
+    assert _bitboard_states() is None, "Rule leading to an unregistered state was stepped as a bitboard"
+    assert grid_step(example_grid) == [["empty", "border"], ["sand", "empty"]], "Unused unregistered state failed"
+
+    _registry_restore(snapshot)
+
+    print("Success!")
+
+def _test_hashlife():
+
+    example_grid = grid_encode(_test_random_grid(13, 9, seed=8))
+    world = hashlife_create(example_grid)
+    assert hashlife_to_grid(world) == example_grid, "Hashlife round trip failed"
+
+    print("Testing hashlife against grid_step_int on a random 13x9 grid")
+
+    expected_grid = example_grid
+    for generations in (1, 2, 3, 8, 16):
+        world = hashlife_advance(world, generations)
+        for _ in range(generations):
+            expected_grid = grid_step_int(expected_grid)
+        print(f"Generation {world.generation}, cached nodes: {len(world.cache.nodes)}")
+        assert hashlife_to_grid(world) == expected_grid, f"Hashlife failed at generation {world.generation}"
+
+    # Tiny cache forces garbage collection on every jump
+    world = hashlife_advance(hashlife_create(example_grid, max_nodes=1), 30)
+    assert hashlife_to_grid(world) == expected_grid, "Hashlife with garbage collection failed"
+    assert len(world.cache.nodes) < 200
+
+    print("Success!")
+
+def _test_sparse_grid():
+
+    example_grid = _test_random_grid(24, 16, seed=9, states=("empty",) * 9 + ("sand",))
+    sparse_grid = sparse_grid_from_grid(example_grid)
+    assert sparse_grid_to_grid(sparse_grid) == example_grid, "Sparse grid round trip failed"
+
+    print("Testing sparse grid against grid_step on a random 24x16 grid")
+
+    for i in range(10):
+        example_grid = grid_step(example_grid)
+        sparse_grid = sparse_grid_step(sparse_grid)
+        assert sparse_grid_to_grid(sparse_grid) == example_grid, f"Sparse grid step failed at step {i+1}"
+
+    # Far too large to allocate as a dense grid
+    sparse_grid = sparse_grid_create(100_000, 100_000, {(5, 5): "sand", (70_000, 99_998): "sand"})
+    for _ in range(3):
+        sparse_grid = sparse_grid_step(sparse_grid)
+    print("Huge Sparse Grid:", sparse_grid.cells)
+    assert sparse_grid.cells == {(5, 8): "sand", (70_000, 99_999): "sand"}
+
+    print("Success!")
+
+def _test_chunk_world():
+
+    # Activity stays away from the grid border, so the unbounded world has to match the grid exactly
+    example_grid = [["empty"] * 40 for _ in range(40)]
+    for y, row in enumerate(_test_random_grid(21, 10, seed=10)):
+        example_grid[y + 3][5:26] = row
+
+    world = chunk_world_from_grid(example_grid, chunk_size=8)
+    assert chunk_world_to_grid(world, 0, 0, 40, 40) == example_grid, "Chunk world round trip failed"
+
+    print("Testing chunk world with 8x8 chunks against grid_step on a 40x40 grid")
+
+    for i in range(12):
+        example_grid = grid_step(example_grid)
+        world = chunk_world_step(world)
+        print(f"Step {i+1} chunks: {len(world.chunks)}, awake: {len(world.awake)}")
+        assert chunk_world_to_grid(world, 0, 0, 40, 40) == example_grid, f"Chunk world step failed at step {i+1}"
+
+    # Unbounded, sand keeps falling into chunks that did not exist before
+    world = chunk_world_create({(-3, -100): "sand"}, chunk_size=8)
+    for _ in range(20):
+        world = chunk_world_step(world)
+    assert chunk_world_to_grid(world, -3, -81, 1, 3) == [["empty"], ["sand"], ["empty"]]
+    assert len(world.chunks) == 1
+
+    print("Success!")
+
+def _test_grid_step_out():
+
+    example_grid = _test_random_grid(24, 16, seed=11)
+    int_grid = grid_encode(example_grid)
+
+    print("Testing double buffered stepping against grid_step on a random 24x16 grid")
+
+    # Two buffers per engine, each step writes into the one that is not being read
+    buffers = (example_grid, [row[:] for row in example_grid])
+    int_buffers = (int_grid, [row[:] for row in int_grid])
+    array_buffers = (np.array(int_grid), np.array(int_grid)) if np is not None else None
+
+    for i in range(6):
+        example_grid = grid_step(example_grid)
+
+        front, back = buffers[i % 2], buffers[(i + 1) % 2]
+        assert grid_step(front, out=back) is back
+        assert back == example_grid, f"Buffered grid step failed at step {i+1}"
+
+        front, back = int_buffers[i % 2], int_buffers[(i + 1) % 2]
+        assert grid_step_int(front, out=back) is back
+        assert grid_decode(back) == example_grid, f"Buffered int grid step failed at step {i+1}"
+
+        if array_buffers is not None:
+            front, back = array_buffers[i % 2], array_buffers[(i + 1) % 2]
+            assert grid_step_numpy(front, out=back) is back
+            assert grid_decode(back.tolist()) == example_grid, f"Buffered numpy grid step failed at step {i+1}"
+
+    # Three states so grid_step does not use the bitboard engine
+    snapshot = _registry_snapshot()
+    cell_state_register("stone", color=(128, 128, 128))
+
+    stone_grid = _test_random_grid(10, 6, seed=12, states=("empty", "sand", "stone"))
+    out = [row[:] for row in stone_grid]
+    assert grid_step(stone_grid, out=out) == grid_step(stone_grid), "Buffered grid step failed with three states"
+
+    _registry_restore(snapshot)
+
+    print("Success!")
+
+def _test_grid_run():
+
+    snapshot = _registry_snapshot()
+
+    # Once with the two state bitboard engine and once with a third state registered
+    for name in (None, "stone"):
+        if name is not None:
+            cell_state_register(name, color=(128, 128, 128))
+
+        # A state that is never registered is never matched, the same as in grid_step
+        cell_state_add_new_rule(cell_pattern_create({(0, 0): "sand", (0, -1): "lava"}, "moore"), "empty")
+
+        example_grid = _test_random_grid(24, 16, seed=13, states=("empty", "sand", name or "sand"))
+        print(f"Testing grid_run against grid_step with {len(CELL_STATE_REGISTRY)} states")
+
+        expected_grids = {}
+        expected_grid = example_grid
+        for generation in range(1, 8):
+            expected_grid = grid_step(expected_grid)
+            expected_grids[generation] = expected_grid
+
+        hooked = []
+        result = grid_run(example_grid, 7, hook=lambda generation, grid: hooked.append((generation, grid)), hook_every=3)
+
+        assert result == expected_grids[7], "grid_run failed"
+        assert hooked == [(3, expected_grids[3]), (6, expected_grids[6])], "grid_run hooks failed"
+
+        try:
+            grid_run(example_grid, 7, hook=hooked.append, hook_every=0)
+            assert False, "hook_every=0 should be rejected"
+        except ValueError:
+            pass
+
+        int_grid = grid_encode(example_grid)
+        for step in (grid_step_int, grid_step_table, grid_step_tree, grid_step_bitset):
+            assert grid_decode(step(int_grid)) == expected_grids[1], f"{step.__name__} failed"
+        if np is not None:
+            for step in (grid_step_numpy, grid_step_jit):
+                assert grid_decode(step(np.array(int_grid)).tolist()) == expected_grids[1], f"{step.__name__} failed"
+
+    _registry_restore(snapshot)
+
+    print("Success!")
+
+def _test_grid_step_delta():
+
+    print("Testing grid_step_delta and apply_delta against grid_step_int on a random 20x14 grid")
+
+    int_grid = grid_encode(_test_random_grid(20, 14, seed=25))
+    delta = None
+
+    for boundary in BOUNDARY_MODES:
+        current_grid = [row[:] for row in int_grid]
+        for i in range(5):
+            expected_grid = grid_step_int(current_grid, boundary=boundary)
+            previous_grid = [row[:] for row in current_grid]
+
+            delta = grid_step_delta(current_grid, delta, boundary)
+            changed = sum(a != b for row, new_row in zip(current_grid, expected_grid) for a, b in zip(row, new_row))
+            assert len(delta.xs) == changed, f"'{boundary}' delta has {len(delta.xs)} changes instead of {changed}"
+            assert all(current_grid[y][x] == old_id for x, y, old_id in zip(delta.xs, delta.ys, delta.old_ids))
+
+            assert apply_delta(current_grid, delta) == expected_grid, f"'{boundary}' apply failed at step {i+1}"
+            assert apply_delta([row[:] for row in expected_grid], delta, reverse=True) == previous_grid, "Undo failed"
+
+    print("Success!")
+
+def _test_grid_find_cycle():
+
+    print("Testing cycle detection on the falling sand and a blinking ruleset")
+
+    # The falling sand of _test_grid_step settles at step 2
+    example_grid = [["empty"] * 4, ["empty", "sand", "empty", "empty"], ["empty"] * 4, ["empty"] * 4]
+    cycle = grid_find_cycle(example_grid, 100)
+    assert (cycle.start, cycle.period) == (2, 1), f"Expected stable at step 2, got {cycle}"
+    assert grid_cycle_at(cycle, 10 ** 9) == grid_run(example_grid, 2), "Fast forward to the fixed point failed"
+    assert grid_find_cycle(example_grid, 1) is None, "Cycle reported before it was reached"
+
+    # Generations are hashed incrementally with the same keys as active grids
+    for generation, grid_hash, frame in _grid_generation_hashes(example_grid, 3, "border"):
+        assert grid_hash == grid_zobrist_hash(grid_encode(grid_run(example_grid, generation))), "Wrong generation hash"
+        assert frame() == grid_run(example_grid, generation), f"Wrong generation {generation}"
+
+    snapshot = _registry_snapshot()
+
+    # "on" and "off" swap every step, "idle" turns "off" unless it is next to the border
+    for name in ("on", "off", "idle"):
+        cell_state_register(name, color=(255, 255, 255))
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "on"}, "moore"), "off")
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "off"}, "moore"), "on")
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "idle", (0, 1): "idle"}, "von_neumann"), "off")
+
+    blink_grid = [["on", "idle", "idle"], ["idle", "idle", "off"], ["idle", "on", "idle"], ["off", "idle", "on"]]
+
+    for boundary in BOUNDARY_MODES:
+        cycle = grid_find_cycle(blink_grid, 100, boundary)
+        expected_grids = [blink_grid]
+        for _ in range(cycle.start + 2 * cycle.period + 3):
+            expected_grids.append(grid_step(expected_grids[-1], boundary=boundary))
+
+        assert cycle.period == 2, f"'{boundary}' period {cycle.period} is not 2"
+        assert expected_grids[cycle.start] == expected_grids[cycle.start + 2], f"'{boundary}' cycle does not repeat"
+        assert expected_grids[cycle.start - 1] != expected_grids[cycle.start + 1], f"'{boundary}' cycle starts too late"
+        for generation, expected_grid in enumerate(expected_grids):
+            assert grid_cycle_at(cycle, generation) == expected_grid, f"'{boundary}' generation {generation} failed"
+
+    _registry_restore(snapshot)
+
+    print("Success!")
+
+def _test_grid_iter():
+
+    print("Testing grid_iter against grid_step on a random 16x12 grid")
+
+    example_grid = _test_random_grid(16, 12, seed=22)
+    expected_grids = []
+    for _ in range(6):
+        expected_grids.append(grid_step(expected_grids[-1] if expected_grids else example_grid))
+
+    assert list(grid_iter(example_grid, steps=6, copy=True)) == expected_grids, "Copied frames differ from grid_step"
+
+    # Frames share two buffers unless copied
+    for generation, frame in enumerate(grid_iter(example_grid, steps=6), 1):
+        assert frame == expected_grids[generation - 1], f"Frame {generation} differs from grid_step"
+    frames = list(grid_iter(example_grid, steps=3))
+    assert frames[0] is frames[2] and frames[0] is not frames[1], "Frames were not double buffered"
+
+    # Stops after the first frame the predicate accepts
+    stable = list(grid_iter(example_grid, until=lambda generation, frame: frame == expected_grids[4], copy=True))
+    assert stable == expected_grids[:5], "until did not stop at the accepted frame"
+
+    if np is not None:
+        array_frames = list(grid_iter(np.array(grid_encode(example_grid)), steps=6, copy=True))
+        assert [grid_decode(frame.tolist()) for frame in array_frames] == expected_grids, "numpy frames differ"
+
+        frame = next(grid_iter(np.array(grid_encode(example_grid))))
+        try:
+            frame[0, 0] = BORDER_ID
+            assert False, "numpy frame is writeable"
+        except ValueError:
+            pass
+
+    print("Success!")
+
+def _test_halo_grid():
+
+    example_grid = _test_random_grid(24, 16, seed=14)
+    halo_grid = halo_grid_encode(grid_encode(example_grid))
+
+    assert halo_grid.radius == 1 and len(halo_grid.cells) == 26 * 18
+    assert halo_grid_decode(halo_grid) == grid_encode(example_grid), "Halo grid round trip failed"
+    print("Flat Sand Matcher:")
+    print(_cell_matchers_compile_flat(halo_grid.stride)[STATE_IDS["sand"]].source)
+
+    print("Testing halo grid against grid_step on a random 24x16 grid")
+
+    for i in range(6):
+        example_grid = grid_step(example_grid)
+        halo_grid = halo_grid_step(halo_grid)
+        assert grid_decode(halo_grid_decode(halo_grid)) == example_grid, f"Halo grid step failed at step {i+1}"
+
+    print("Success!")
+
+def _test_boundary_modes():
+
+    # Reference with explicit modulo or mirrored neighbor lookups
+    def reference_step(grid, boundary):
+        height, width = len(grid), len(grid[0])
+
+        def index(i, size):
+            if boundary == "wrap":
+                return i % size
+            return -i - 1 if i < 0 else (2 * size - i - 1 if i >= size else i)
+
+        new_grid = []
+        for y, row in enumerate(grid):
+            new_row = []
+            for x, name in enumerate(row):
+                new_name = name
+                for pattern, rule_new_name in CELL_STATE_REGISTRY[name].rules:
+                    offsets = NEIGHBORHOOD_OFFSETS[pattern.neighborhood_type]
+                    neighborhood = [grid[index(y + dy, height)][index(x + dx, width)] for dy, dx in offsets]
+                    if _cell_pattern_match(pattern, neighborhood):
+                        new_name = rule_new_name
+                        break
+                new_row.append(new_name)
+            new_grid.append(new_row)
+        return new_grid
+
+    snapshot = _registry_snapshot()
+
+    # Once with the two state bitboard engine and once with a third state registered
+    for name in (None, "stone"):
+        if name is not None:
+            cell_state_register(name, color=(128, 128, 128))
+            cell_state_add_new_rule(cell_pattern_create({(0, 0): name, (1, 0): "sand"}, "von_neumann"), "sand")
+
+        for boundary in BOUNDARY_MODES[1:]:
+            print(f"Testing '{boundary}' boundaries with {len(CELL_STATE_REGISTRY)} states")
+
+            example_grid = _test_random_grid(13, 9, seed=15, states=("empty", "sand", name or "sand"))
+            int_grid = halo_grid = None
+
+            for i in range(6):
+                expected_grid = reference_step(example_grid, boundary)
+                int_grid = grid_encode(example_grid)
+
+                assert grid_step(example_grid, boundary=boundary) == expected_grid, f"grid_step failed at step {i+1}"
+                for step in (grid_step_int, grid_step_table, grid_step_tree):
+                    assert grid_decode(step(int_grid, boundary=boundary)) == expected_grid, f"{step.__name__} failed"
+                if np is not None:
+                    array = grid_step_numpy(np.array(int_grid), boundary=boundary)
+                    assert grid_decode(array.tolist()) == expected_grid, f"grid_step_numpy failed at step {i+1}"
+
+                halo_grid = halo_grid_step(halo_grid or halo_grid_encode(int_grid), boundary=boundary)
+                assert grid_decode(halo_grid_decode(halo_grid)) == expected_grid, f"halo_grid_step failed at step {i+1}"
+
+                example_grid = expected_grid
+
+            start_grid = _test_random_grid(13, 9, seed=15, states=("empty", "sand", name or "sand"))
+            assert grid_run(start_grid, 6, boundary=boundary) == example_grid, "grid_run failed"
+
+            # Grids without rows or cells are returned unchanged, like by the original grid_step
+            for empty_grid in ([], [[]], [[], []]):
+                assert grid_step(empty_grid, boundary=boundary) == empty_grid, f"{empty_grid} failed"
+                assert grid_run(empty_grid, 2, boundary=boundary) == empty_grid, f"grid_run of {empty_grid} failed"
+                for step in (grid_step_int, grid_step_table, grid_step_tree, grid_step_bitset):
+                    assert step(empty_grid, boundary=boundary) == empty_grid, f"{step.__name__} of {empty_grid} failed"
+                if np is not None:
+                    array = np.array(empty_grid, dtype=np.int64).reshape(len(empty_grid), 0)
+                    assert grid_step_numpy(array, boundary=boundary).shape == array.shape, "Empty array failed"
+
+    _registry_restore(snapshot)
+
+    print("Success!")
+
+def _test_custom_neighborhood():
+
+    print("Testing a neighborhood registered in NEIGHBORHOODS without offsets")
+
+    def get_below_neighborhood(arr, x, y, border=BORDER_VALUE):
+        return arr[y][x], arr[y + 1][x] if y < len(arr) - 1 else border
+
+    snapshot = _registry_snapshot()
+    NEIGHBORHOODS["below"] = get_below_neighborhood
+
+    try:
+        cell_state_register("empty", color=(0, 0, 0))
+        cell_state_register("stone", color=(128, 128, 128))
+        cell_state_add_new_rule(Pattern(["empty", "stone"], "below"), "stone")
+
+        example_grid = [["empty", "empty"], ["stone", "empty"]]
+        expected_grid = [["stone", "empty"], ["stone", "empty"]]
+
+        assert grid_step(example_grid) == expected_grid, "grid_step failed"
+        assert grid_decode(grid_step_int(grid_encode(example_grid))) == expected_grid, "grid_step_int failed"
+
+        generations = []
+        run_grid = grid_run(example_grid, 3, hook=lambda generation, _: generations.append(generation))
+        assert run_grid == grid_step(grid_step(expected_grid)), "grid_run failed"
+        assert generations == [1, 2, 3], "grid_run hook failed"
+
+        # Uniform rows next to each other are not quiet when the neighborhood reaches two rows down
+        NEIGHBORHOODS["below"] = lambda arr, x, y, border=BORDER_VALUE: (
+            arr[y][x], arr[y + 2][x] if y < len(arr) - 2 else border
+        )
+        _COMPILED_CACHE.clear()
+
+        example_grid = [["empty", "empty"], ["empty", "empty"], ["stone", "sand"]]
+        expected_grid = [["stone", "empty"], ["empty", "empty"], ["stone", "sand"]]
+
+        assert grid_step(example_grid) == expected_grid, "grid_step skipped a row two above a change"
+        assert grid_decode(grid_step_int(grid_encode(example_grid))) == expected_grid, "grid_step_int skipped a row"
+
+        # Without offsets there is no way to wrap or reflect the neighborhood
+        for boundary in BOUNDARY_MODES[1:]:
+            try:
+                grid_step(example_grid, boundary=boundary)
+                assert False, f"'{boundary}' boundaries should need offsets"
+            except ValueError:
+                pass
+    finally:
+        del NEIGHBORHOODS["below"]
+        _registry_restore(snapshot)
+
+    print("Success!")
+
+def _test_parallel_grid():
+
+    print("Testing parallel grid against grid_step_int on a random 30x23 grid")
+
+    int_grid = grid_encode(_test_random_grid(30, 23, seed=17))
+
+    for boundary in BOUNDARY_MODES:
+        parallel_grid = parallel_grid_create(int_grid, processes=3)
+        expected_grid = int_grid
+
+        try:
+            for i in range(4):
+                expected_grid = grid_step_int(expected_grid, boundary=boundary)
+                parallel_grid_step(parallel_grid, boundary=boundary)
+                assert parallel_grid_to_grid(parallel_grid) == expected_grid, f"'{boundary}' failed at step {i+1}"
+
+            expected_grid = grid_step_int(grid_step_int(expected_grid, boundary=boundary), boundary=boundary)
+            parallel_grid_step(parallel_grid, steps=2, boundary=boundary)
+            assert parallel_grid_to_grid(parallel_grid) == expected_grid, f"'{boundary}' failed with steps=2"
+        finally:
+            parallel_grid_close(parallel_grid)
+
+    # A pool that fails to start must not leave the shared memory blocks behind
+    shared_before = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else None
+    try:
+        parallel_grid_create(int_grid, processes=-1)
+        assert False, "Pool with -1 processes was created"
+    except ValueError:
+        pass
+    if shared_before is not None:
+        assert set(os.listdir("/dev/shm")) <= shared_before, "Shared memory blocks leaked"
+
+    print("Success!")
+
+def _test_grid_step_threaded():
+
+    print("Testing grid_step_threaded against grid_step_int on a random 25x19 grid")
+
+    int_grid = grid_encode(_test_random_grid(25, 19, seed=18))
+
+    for boundary in BOUNDARY_MODES:
+        expected_grid = grid_step_int(int_grid, boundary=boundary)
+        for threads in (None, 1, 4, 40):
+            new_grid = grid_step_threaded(int_grid, threads=threads, boundary=boundary)
+            assert new_grid == expected_grid, f"'{boundary}' with {threads} threads failed"
+
+    out = [[BORDER_ID] * 25 for _ in range(19)]
+    assert grid_step_threaded(int_grid, out, threads=4) is out, "Output buffer was not used"
+    assert out == grid_step_int(int_grid), "Output buffer has the wrong cells"
+
+    print("Success!")
+
+# ------------------ BENCHMARKS ------------------
+
+def _benchmark_sand_rules(extra_rule_count=0):
+
+    _registry_restore({})
+    cell_state_register("empty", color=(0, 0, 0))
+    cell_state_register("sand", color=(255, 255, 0))
+
+    # Rules that are checked (and fail) before the actual sand rules
+    for i in range(extra_rule_count):
+        for name in ("empty", "sand"):
+            pattern = cell_pattern_create({(0, 0): name, (0, 1): "border", (0, -1): "border"}, "moore")
+            cell_state_add_new_rule(pattern, name)
+
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "sand", (0, -1): "empty"}, "moore"), "empty")
+    cell_state_add_new_rule(cell_pattern_create({(0, 0): "empty", (0, 1): "sand"}, "moore"), "sand")
+
+
+def _benchmark_time(func, grid, steps):
+    start = time.perf_counter()
+    for _ in range(steps):
+        grid = func(grid)
+    return time.perf_counter() - start
+
+
+def _grid_step_neighborhood_per_rule(grid: list[list]) -> list[list]:
+    # grid_step before neighborhoods were shared between rules, kept as a baseline
+    new_grid = [[EMPTY_VALUE for _ in range(len(grid[0]))] for _ in range(len(grid))]
+
+    for y, row in enumerate(grid):
+        for x, cell_state_name in enumerate(row):
+            for pattern, cell_new_state_name in CELL_STATE_REGISTRY[cell_state_name].rules:
+                neighborhood = NEIGHBORHOODS[pattern.neighborhood_type](grid, x, y)
+                if _cell_pattern_match(pattern, neighborhood):
+                    new_grid[y][x] = cell_new_state_name
+                    break
+            else:
+                new_grid[y][x] = cell_state_name
+
+    return new_grid
+
+
+def _benchmark_neighborhood_sharing():
+
+    grid = _test_random_grid(64, 64, seed=0)
+
+    print("Neighborhood once per rule vs grid_step (64x64, 5 steps)")
+    print(f"{'rules':>6} {'per rule':>10} {'grid_step':>10} {'speedup':>8}")
+
+    for extra_rule_count in (0, 5, 10, 20, 40):
+        _benchmark_sand_rules(extra_rule_count)
+
+        # A third state keeps grid_step on per cell matchers instead of two state bitboards
+        cell_state_register("stone", color=(128, 128, 128))
+        per_rule = _benchmark_time(_grid_step_neighborhood_per_rule, grid, 5)
+        per_step = _benchmark_time(grid_step, grid, 5)
+        print(f"{extra_rule_count + 1:>6} {per_rule:>9.3f}s {per_step:>9.3f}s {per_rule / per_step:>7.2f}x")
+
+
+def _benchmark_rule_bitsets():
+
+    _benchmark_sand_rules()
+    int_grid = grid_encode(_test_random_grid(64, 64, seed=0))
+
+    print("Rule bitsets vs generated matchers (64x64, 5 steps)")
+    print(f"{'rules':>6} {'matchers':>10} {'bitsets':>10} {'speedup':>8}")
+
+    for extra_rule_count in (0, 10, 50, 200):
+        _benchmark_sand_rules(extra_rule_count)
+        matchers = _benchmark_time(grid_step_int, int_grid, 5)
+        bitsets = _benchmark_time(grid_step_bitset, int_grid, 5)
+        print(f"{extra_rule_count + 1:>6} {matchers:>9.3f}s {bitsets:>9.3f}s {matchers / bitsets:>7.2f}x")
+
+
+def _benchmark_ensemble_step():
+
+    if np is None:
+        print("numpy is not installed, skipping the ensemble benchmark")
+        return
+
+    _benchmark_sand_rules()
+    stack = np.array([grid_encode(_test_random_grid(64, 64, seed=seed)) for seed in range(500)])
+
+    per_grid = _benchmark_time(lambda grids: np.array([grid_step_numpy(grid) for grid in grids]), stack, 5)
+    ensemble = _benchmark_time(ensemble_step, stack, 5)
+
+    print("ensemble_step vs grid_step_numpy per grid (500 64x64 grids, 5 steps)")
+    print(f"{'per grid':>9} {per_grid:>8.3f}s")
+    print(f"{'ensemble':>9} {ensemble:>8.3f}s {per_grid / ensemble:>7.2f}x")
+
+
+def _benchmark_grid_step_delta():
+
+    _benchmark_sand_rules()
+
+    def step_and_diff(grid):
+        new_grid = grid_step_int(grid)
+        changes = [  # noqa: F841
+            (x, y, state_id, new_state_id)
+            for y, (row, new_row) in enumerate(zip(grid, new_grid))
+            for x, (state_id, new_state_id) in enumerate(zip(row, new_row))
+            if state_id != new_state_id
+        ]
+        return new_grid
+
+    def step_delta(grid):
+        return apply_delta(grid, grid_step_delta(grid))
+
+    print("grid_step_delta + apply_delta vs grid_step_int + diff (256x256, 10 steps)")
+    print(f"{'grid':>8} {'diff':>9} {'delta':>9} {'speedup':>8}")
+
+    # Right after a random start about half the cells change, once the sand has mostly settled only a few do
+    random_grid = _test_random_grid(256, 256, seed=0)
+    for name, grid in (("random", random_grid), ("settled", grid_run(random_grid, 300))):
+        diff = _benchmark_time(step_and_diff, grid_encode(grid), 10)
+        delta = _benchmark_time(step_delta, grid_encode(grid), 10)
+        print(f"{name:>8} {diff:>8.3f}s {delta:>8.3f}s {diff / delta:>7.2f}x")
+
+
+def _benchmark_parallel_grid():
+
+    _benchmark_sand_rules()
+    int_grid = grid_encode(_test_random_grid(512, 512, seed=0))
+    serial = _benchmark_time(grid_step_int, int_grid, 5)
+
+    print(f"Parallel grid vs grid_step_int (512x512, 5 steps, {os.cpu_count()} cores)")
+    print(f"{'processes':>10} {'time':>9} {'speedup':>8}")
+    print(f"{'serial':>10} {serial:>8.3f}s {1:>7.2f}x")
+
+    processes = 1
+    while processes <= 2 * (os.cpu_count() or 1):
+        parallel_grid = parallel_grid_create(int_grid, processes)
+        try:
+            start = time.perf_counter()
+            parallel_grid_step(parallel_grid, steps=5)
+            parallel = time.perf_counter() - start
+        finally:
+            parallel_grid_close(parallel_grid)
+        print(f"{processes:>10} {parallel:>8.3f}s {serial / parallel:>7.2f}x")
+        processes *= 2
+
+
+def _benchmark_grid_step_threaded():
+
+    _benchmark_sand_rules()
+    int_grid = grid_encode(_test_random_grid(256, 256, seed=0))
+    serial = _benchmark_time(grid_step_int, int_grid, 5)
+
+    gil = "disabled" if _gil_disabled() else "enabled"
+    print(f"grid_step_threaded vs grid_step_int (256x256, 5 steps, {os.cpu_count()} cores, GIL {gil})")
+    print(f"{'threads':>8} {'time':>9} {'speedup':>8}")
+    print(f"{'serial':>8} {serial:>8.3f}s {1:>7.2f}x")
+
+    threads = 1
+    while threads <= 2 * (os.cpu_count() or 1):
+        threaded = _benchmark_time(lambda grid: grid_step_threaded(grid, threads=threads), int_grid, 5)
+        print(f"{threads:>8} {threaded:>8.3f}s {serial / threaded:>7.2f}x")
+        threads *= 2
+
+
+def _benchmark_grid_step_jit():
+
+    if np is None or _jit_kernel_load() is None:
+        print("numpy or numba is not installed, skipping the jit benchmark")
+        return
+
+    _benchmark_sand_rules()
+    array = np.array(grid_encode(_test_random_grid(512, 512, seed=0)))
+
+    # First call loads the kernel from the on disk cache (or compiles it)
+    start = time.perf_counter()
+    grid_step_jit(array)
+    warm_up = time.perf_counter() - start
+
+    print(f"grid_step_jit vs grid_step_numpy (512x512, 20 steps, {warm_up:.3f}s warm up)")
+    print(f"{'numpy':>6} {_benchmark_time(grid_step_numpy, array, 20):>8.3f}s")
+    print(f"{'jit':>6} {_benchmark_time(grid_step_jit, array, 20):>8.3f}s")
+
+
+def benchmark():
+    print("-" * 20)
+    _benchmark_neighborhood_sharing()
+    print("-" * 20)
+    _benchmark_rule_bitsets()
+    print("-" * 20)
+    _benchmark_ensemble_step()
+    print("-" * 20)
+    _benchmark_grid_step_delta()
+    print("-" * 20)
+    _benchmark_parallel_grid()
+    print("-" * 20)
+    _benchmark_grid_step_threaded()
+    print("-" * 20)
+    _benchmark_grid_step_jit()
+    print("-" * 20)
+
+# ------------------ DEBUG ------------------
+
+def debug():
+    # Call the test function
+    print("-" * 20)
+    _test_neighborhood_functions()
+    print("-" * 20)
+    _test_cell_pattern_create()
+    print("-" * 20)
+    _test_cell_state_and_pattern_matching_functions()
+    print("-" * 20)
+    _test_grid_step()
+    print("-" * 20)
+    _test_grid_step_int()
+    print("-" * 20)
+    _test_grid_step_numpy()
+    print("-" * 20)
+    _test_grid_step_jit()
+    print("-" * 20)
+    _test_ensemble_step()
+    print("-" * 20)
+    _test_grid_step_table()
+    print("-" * 20)
+    _test_cell_matchers()
+    print("-" * 20)
+    _test_grid_step_tree()
+    print("-" * 20)
+    _test_grid_step_bitset()
+    print("-" * 20)
+    _test_active_grid()
+    print("-" * 20)
+    _test_quiescent_states()
+    print("-" * 20)
+    _test_bitboard()
+    print("-" * 20)
+    _test_hashlife()
+    print("-" * 20)
+    _test_sparse_grid()
+    print("-" * 20)
+    _test_chunk_world()
+    print("-" * 20)
+    _test_grid_step_out()
+    print("-" * 20)
+    _test_grid_run()
+    print("-" * 20)
+    _test_grid_iter()
+    print("-" * 20)
+    _test_grid_find_cycle()
+    print("-" * 20)
+    _test_grid_step_delta()
+    print("-" * 20)
+    _test_halo_grid()
+    print("-" * 20)
+    _test_boundary_modes()
+    print("-" * 20)
+    _test_custom_neighborhood()
+    print("-" * 20)
+    _test_parallel_grid()
+    print("-" * 20)
+    _test_grid_step_threaded()
     print("-" * 20)
     print("\nAll tests passed successfully!")
 
 
 if __name__ == "__main__":
-    debug()
+    if sys.argv[1:] == ["benchmark"]:
+        benchmark()
+    else:
+        debug()